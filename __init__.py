@@ -4,6 +4,10 @@ debug = True
 if debug:
     import nodes_for_python.nodes
     import nodes_for_python.utils
+    import nodes_for_python.catalog
+    import nodes_for_python.graph
+    import nodes_for_python.evaluate
+    import nodes_for_python.optimizer
     import nodes_for_python.system
     import nodes_for_python.generator
     import nodes_for_python.layout
@@ -11,6 +15,10 @@ if debug:
     import importlib
     importlib.reload(nodes_for_python.nodes)
     importlib.reload(nodes_for_python.utils)
+    importlib.reload(nodes_for_python.catalog)
+    importlib.reload(nodes_for_python.graph)
+    importlib.reload(nodes_for_python.evaluate)
+    importlib.reload(nodes_for_python.optimizer)
     importlib.reload(nodes_for_python.system)
     importlib.reload(nodes_for_python.generator)
     importlib.reload(nodes_for_python.layout)
@@ -0,0 +1,108 @@
+import bpy
+import os
+import json
+import tempfile
+
+from nodes_for_python.utils import *
+
+CATALOG_VERSION = 4
+
+def catalog_key():
+    """
+    Returns the key the cached catalog is valid for: the catalog format, the Blender version
+    and the set of enabled add-ons (which may register their own shader nodes).
+    """
+    addons = sorted(bpy.context.preferences.addons.keys())
+    return {"format": CATALOG_VERSION, "blender": list(bpy.app.version), "addons": addons}
+
+def default_catalog_path():
+    return os.path.join(bpy.utils.user_resource('CONFIG'), "nodes_for_python", "catalog.json")
+
+def load_catalog(path = None):
+    """
+    Returns the list of shader node catalog entries (class name, writable properties, input and output sockets,
+    default width and height).
+    The catalog is read from the cache file when it was written for the same key (see catalog_key),
+    otherwise it is extracted from sample nodes and the cache file is rewritten.
+    path = location of the cache file, None for the default one in Blender's config folder.
+    """
+    path = path or default_catalog_path()
+    key = catalog_key()
+    entries = read_catalog(path, key)
+    if entries is None:
+        entries = build_catalog()
+        write_catalog(path, key, entries)
+    return entries
+
+def read_catalog(path, key):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get("key") != key:
+        return None
+
+    return [_restore_entry(entry) for entry in data["nodes"]]
+
+def write_catalog(path, key, entries):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "nodes": entries}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def build_catalog():
+    sample_tree = bpy.data.node_groups.new("samples", 'ShaderNodeTree')
+    try:
+        sample_nodes = sample_tree.nodes
+        for name in sorted(get_shader_names()):
+            if name == "ShaderNodeGroup":
+                continue
+            try:
+                sample_nodes.new(name)
+            except RuntimeError:
+                pass
+
+        return [make_catalog_entry(node) for node in sample_nodes]
+    finally:
+        bpy.data.node_groups.remove(sample_tree)
+
+def _initial_value(node, info):
+    """
+    Returns the value of the property on a new node, which may differ from the RNA default
+    when the node initializes it.
+    """
+    try:
+        value = getattr(node, info.name)
+        return tuple(sorted(value)) if isinstance(value, set) else plain_value(value)
+    except (AttributeError, TypeError):
+        return info.default
+
+def make_catalog_entry(node):
+    properties = [(p.name, p.type, _initial_value(node, p), p.enum_items) for p in get_property_infos(node.__class__)]
+    return {
+        "class_name": node.__class__.__name__,
+        "properties": properties,
+        "inputs": get_socket_specs(node.inputs),
+        "outputs": get_socket_specs(node.outputs),
+        "width": node.width,
+        "height": node.height,
+    }
+
+def _restore_value(value):
+    if isinstance(value, list):
+        return tuple(_restore_value(v) for v in value)
+    return value
+
+def _restore_entry(entry):
+    entry["properties"] = [(name, type, _restore_value(default), enum_items)
+        for name, type, default, enum_items in entry["properties"]]
+    entry["inputs"] = [tuple(_restore_value(v) for v in spec) for spec in entry["inputs"]]
+    entry["outputs"] = [tuple(_restore_value(v) for v in spec) for spec in entry["outputs"]]
+    return entry
@@ -0,0 +1,249 @@
+import math
+import colorsys
+
+FLT_EPSILON = 1.1920929e-07
+
+def _safe_divide(a, b):
+    return a / b if b != 0 else 0.0
+
+def _safe_modulo(a, b):
+    return math.fmod(a, b) if b != 0 else 0.0
+
+def _floored_modulo(a, b):
+    return a - math.floor(a / b) * b if b != 0 else 0.0
+
+def _power(a, b):
+    if a < 0 and b != int(b):
+        return 0.0
+    if b == 0:
+        return 1.0
+    if a == 0:
+        return 0.0
+    return math.pow(a, b)
+
+def _logarithm(a, b):
+    if a > 0 and b > 0:
+        return _safe_divide(math.log(a), math.log(b))
+    return 0.0
+
+def _sign(a):
+    return 1.0 if a > 0 else -1.0 if a < 0 else 0.0
+
+def _smooth_min(a, b, c):
+    if c != 0:
+        h = max(c - abs(a - b), 0.0) / c
+        return min(a, b) - h * h * h * c * (1.0 / 6.0)
+    return min(a, b)
+
+def _truncate(a):
+    return float(math.floor(a)) if a >= 0 else float(math.ceil(a))
+
+def _fraction(a):
+    return a - math.floor(a)
+
+def _wrap(a, b, c):
+    r = b - c
+    return a - r * math.floor((a - c) / r) if r != 0 else c
+
+def _snap(a, b):
+    return math.floor(_safe_divide(a, b)) * b
+
+def _ping_pong(a, b):
+    return abs(_fraction((a - b) / (b * 2)) * b * 2 - b) if b != 0 else 0.0
+
+def _in_unit_range(f):
+    return lambda a, b, c: f(a) if -1 <= a <= 1 else None
+
+# operation -> (indices of the inputs used, function of the three input values)
+# a function returning None means the operation cannot be evaluated exactly for these inputs
+MATH_OPERATIONS = {
+    'ADD': ((0, 1), lambda a, b, c: a + b),
+    'SUBTRACT': ((0, 1), lambda a, b, c: a - b),
+    'MULTIPLY': ((0, 1), lambda a, b, c: a * b),
+    'DIVIDE': ((0, 1), lambda a, b, c: _safe_divide(a, b)),
+    'MULTIPLY_ADD': ((0, 1, 2), lambda a, b, c: a * b + c),
+    'POWER': ((0, 1), lambda a, b, c: _power(a, b)),
+    'LOGARITHM': ((0, 1), lambda a, b, c: _logarithm(a, b)),
+    'SQRT': ((0,), lambda a, b, c: math.sqrt(a) if a > 0 else 0.0),
+    'INVERSE_SQRT': ((0,), lambda a, b, c: 1.0 / math.sqrt(a) if a > 0 else 0.0),
+    'ABSOLUTE': ((0,), lambda a, b, c: abs(a)),
+    'EXPONENT': ((0,), lambda a, b, c: math.exp(a)),
+    'MINIMUM': ((0, 1), lambda a, b, c: min(a, b)),
+    'MAXIMUM': ((0, 1), lambda a, b, c: max(a, b)),
+    'LESS_THAN': ((0, 1), lambda a, b, c: 1.0 if a < b else 0.0),
+    'GREATER_THAN': ((0, 1), lambda a, b, c: 1.0 if a > b else 0.0),
+    'SIGN': ((0,), lambda a, b, c: _sign(a)),
+    'COMPARE': ((0, 1, 2), lambda a, b, c: 1.0 if abs(a - b) <= max(c, FLT_EPSILON) else 0.0),
+    'SMOOTH_MIN': ((0, 1, 2), lambda a, b, c: _smooth_min(a, b, c)),
+    'SMOOTH_MAX': ((0, 1, 2), lambda a, b, c: -_smooth_min(-a, -b, c)),
+    'ROUND': ((0,), lambda a, b, c: float(math.floor(a + 0.5))),
+    'FLOOR': ((0,), lambda a, b, c: float(math.floor(a))),
+    'CEIL': ((0,), lambda a, b, c: float(math.ceil(a))),
+    'TRUNC': ((0,), lambda a, b, c: _truncate(a)),
+    'FRACT': ((0,), lambda a, b, c: _fraction(a)),
+    'MODULO': ((0, 1), lambda a, b, c: _safe_modulo(a, b)),
+    'FLOORED_MODULO': ((0, 1), lambda a, b, c: _floored_modulo(a, b)),
+    'WRAP': ((0, 1, 2), lambda a, b, c: _wrap(a, b, c)),
+    'SNAP': ((0, 1), lambda a, b, c: _snap(a, b)),
+    'PINGPONG': ((0, 1), lambda a, b, c: _ping_pong(a, b)),
+    'SINE': ((0,), lambda a, b, c: math.sin(a)),
+    'COSINE': ((0,), lambda a, b, c: math.cos(a)),
+    'TANGENT': ((0,), lambda a, b, c: math.tan(a)),
+    'ARCSINE': ((0,), _in_unit_range(math.asin)),
+    'ARCCOSINE': ((0,), _in_unit_range(math.acos)),
+    'ARCTANGENT': ((0,), lambda a, b, c: math.atan(a)),
+    'ARCTAN2': ((0, 1), lambda a, b, c: math.atan2(a, b)),
+    'SINH': ((0,), lambda a, b, c: math.sinh(a)),
+    'COSH': ((0,), lambda a, b, c: math.cosh(a)),
+    'TANH': ((0,), lambda a, b, c: math.tanh(a)),
+    'RADIANS': ((0,), lambda a, b, c: math.radians(a)),
+    'DEGREES': ((0,), lambda a, b, c: math.degrees(a)),
+}
+
+def evaluate_math(operation, a, b, c, use_clamp = False):
+    """
+    Returns the output of a Math node for the given input values, None when it cannot be computed.
+    """
+    entry = MATH_OPERATIONS.get(operation)
+    if entry is None:
+        return None
+    try:
+        result = entry[1](float(a), float(b), float(c))
+    except (ArithmeticError, ValueError):
+        return None
+    if result is None or math.isnan(result) or math.isinf(result):
+        return None
+    return min(max(result, 0.0), 1.0) if use_clamp else float(result)
+
+def _vector(f):
+    return lambda a, b, c, s: tuple(f(x, y, z) for x, y, z in zip(a, b, c))
+
+def _dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+def _length(a):
+    return math.sqrt(_dot(a, a))
+
+def _scale(a, s):
+    return tuple(x * s for x in a)
+
+def _normalize(a):
+    length = _length(a)
+    return _scale(a, 1.0 / length) if length != 0 else (0.0, 0.0, 0.0)
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+def _project(a, b):
+    length_squared = _dot(b, b)
+    return _scale(b, _dot(a, b) / length_squared) if length_squared != 0 else (0.0, 0.0, 0.0)
+
+def _reflect(a, b):
+    n = _normalize(b)
+    return tuple(x - 2.0 * _dot(n, a) * y for x, y in zip(a, n))
+
+def _refract(a, b, eta):
+    n = _normalize(b)
+    d = _dot(n, a)
+    k = 1.0 - eta * eta * (1.0 - d * d)
+    if k < 0:
+        return (0.0, 0.0, 0.0)
+    return tuple(eta * x - (eta * d + math.sqrt(k)) * y for x, y in zip(a, n))
+
+def _face_forward(a, b, c):
+    return a if _dot(c, b) < 0 else _scale(a, -1.0)
+
+# operation -> (indices of the inputs used, function of the three vectors and the scale returning (vector, value))
+VECTOR_MATH_OPERATIONS = {
+    'ADD': ((0, 1), _vector(lambda x, y, z: x + y)),
+    'SUBTRACT': ((0, 1), _vector(lambda x, y, z: x - y)),
+    'MULTIPLY': ((0, 1), _vector(lambda x, y, z: x * y)),
+    'DIVIDE': ((0, 1), _vector(lambda x, y, z: _safe_divide(x, y))),
+    'MULTIPLY_ADD': ((0, 1, 2), _vector(lambda x, y, z: x * y + z)),
+    'CROSS_PRODUCT': ((0, 1), lambda a, b, c, s: _cross(a, b)),
+    'PROJECT': ((0, 1), lambda a, b, c, s: _project(a, b)),
+    'REFLECT': ((0, 1), lambda a, b, c, s: _reflect(a, b)),
+    'REFRACT': ((0, 1, 3), lambda a, b, c, s: _refract(a, b, s)),
+    'FACEFORWARD': ((0, 1, 2), lambda a, b, c, s: _face_forward(a, b, c)),
+    'DOT_PRODUCT': ((0, 1), lambda a, b, c, s: _dot(a, b)),
+    'DISTANCE': ((0, 1), lambda a, b, c, s: _length(tuple(x - y for x, y in zip(a, b)))),
+    'LENGTH': ((0,), lambda a, b, c, s: _length(a)),
+    'SCALE': ((0, 3), lambda a, b, c, s: _scale(a, s)),
+    'NORMALIZE': ((0,), lambda a, b, c, s: _normalize(a)),
+    'ABSOLUTE': ((0,), _vector(lambda x, y, z: abs(x))),
+    'MINIMUM': ((0, 1), _vector(lambda x, y, z: min(x, y))),
+    'MAXIMUM': ((0, 1), _vector(lambda x, y, z: max(x, y))),
+    'FLOOR': ((0,), _vector(lambda x, y, z: float(math.floor(x)))),
+    'CEIL': ((0,), _vector(lambda x, y, z: float(math.ceil(x)))),
+    'FRACT': ((0,), _vector(lambda x, y, z: _fraction(x))),
+    'MODULO': ((0, 1), _vector(lambda x, y, z: _safe_modulo(x, y))),
+    'WRAP': ((0, 1, 2), _vector(_wrap)),
+    'SNAP': ((0, 1), _vector(lambda x, y, z: _snap(x, y))),
+    'SINE': ((0,), _vector(lambda x, y, z: math.sin(x))),
+    'COSINE': ((0,), _vector(lambda x, y, z: math.cos(x))),
+    'TANGENT': ((0,), _vector(lambda x, y, z: math.tan(x))),
+}
+
+def evaluate_vector_math(operation, a, b, c, scale):
+    """
+    Returns the (vector, value) outputs of a VectorMath node for the given input values,
+    None when they cannot be computed.
+    """
+    entry = VECTOR_MATH_OPERATIONS.get(operation)
+    if entry is None:
+        return None
+    try:
+        result = entry[1](a, b, c, float(scale))
+    except (ArithmeticError, ValueError):
+        return None
+    if isinstance(result, tuple):
+        vector, value = result, 0.0
+    else:
+        vector, value = (0.0, 0.0, 0.0), result
+    if any(math.isnan(x) or math.isinf(x) for x in vector + (value,)):
+        return None
+    return vector, value
+
+def evaluate_combine(class_name, mode, a, b, c):
+    """
+    Returns the output of a combine node (CombineXYZ, CombineRGB, CombineHSV or CombineColor) for
+    the given input values, None for unknown nodes or modes.
+    """
+    a, b, c = float(a), float(b), float(c)
+    if class_name == 'ShaderNodeCombineXYZ':
+        return (a, b, c)
+    if class_name == 'ShaderNodeCombineRGB' or (class_name == 'ShaderNodeCombineColor' and mode == 'RGB'):
+        return (a, b, c, 1.0)
+    if class_name == 'ShaderNodeCombineHSV' or (class_name == 'ShaderNodeCombineColor' and mode == 'HSV'):
+        return colorsys.hsv_to_rgb(a, b, c) + (1.0,)
+    if class_name == 'ShaderNodeCombineColor' and mode == 'HSL':
+        return colorsys.hls_to_rgb(a, c, b) + (1.0,)
+    return None
+
+def as_vector(value):
+    if isinstance(value, (int, float)):
+        return (float(value),) * 3
+    return tuple(float(x) for x in value[:3])
+
+def convert_value(value, socket_type):
+    """
+    Returns value converted the way Blender converts it when linked to a socket of the given type
+    ('VALUE', 'VECTOR' or 'RGBA'), None when the conversion is not supported (eg color to value,
+    which depends on the color management settings).
+    """
+    is_number = isinstance(value, (int, float))
+    if socket_type == 'VALUE':
+        if is_number:
+            return float(value)
+        if len(value) == 3:
+            return sum(value) / 3.0
+        return None
+    if socket_type == 'VECTOR':
+        return as_vector(value)
+    if socket_type == 'RGBA':
+        if is_number:
+            return (float(value),) * 3 + (1.0,)
+        if len(value) == 3:
+            return tuple(value) + (1.0,)
+        return tuple(value)
+    return None
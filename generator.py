@@ -1,33 +1,509 @@
 import bpy
+import math
+import time
+import hashlib
+import asyncio
 
 from nodes_for_python.system import as_node, GroupNode, GroupInputNode, GroupOutputNode
+from nodes_for_python.graph import NodeGraph
+from nodes_for_python.optimizer import to_roots
+import nodes_for_python.optimizer as optimizer
+from nodes_for_python.layout import NodeLayout, write_locations, COLUMN_SPACING
+
+# custom property holding the keys that map a real node to its node in the next incremental generation
+KEY_PROPERTY = "nfp_key"
+# custom property holding the structural hash of the graph a material or node group was generated from
+HASH_PROPERTY = "nfp_hash"
+# socket type -> suffix of the interface socket class of a node group (NodeSocketFloat...)
+SOCKET_CLASS_SUFFIXES = {'VALUE': 'Float', 'INT': 'Int', 'BOOLEAN': 'Bool', 'VECTOR': 'Vector', 'RGBA': 'Color',
+    'STRING': 'String', 'SHADER': 'Shader'}
+
+def _key(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+
+def node_keys(graph, roots):
+    """
+    Returns two keys for each node of the graph built from the given roots, as a "source path" string.
+    Neither depends on socket values, so running the same script again gives the same keys even if values
+    changed. The source key depends on the class and settings of the node and on the source keys of the
+    nodes linked to its inputs (identical producers being told apart by their rank in topological order):
+    it survives edits between the node and the roots. The path key depends on the path from the roots to
+    the node (the consumer that first reaches it, the input and output linked) and on its class: it
+    survives edits between the sources and the node. A node inserted anywhere only changes the source keys
+    of the nodes after it and the path keys of the nodes before it, so every other node keeps a key.
+    """
+    paths = [None] * len(graph)
+    for index, root in enumerate(roots):
+        i = graph.node_ids[as_node(root)]
+        if paths[i] is None:
+            paths[i] = _key("root", index, graph.nodes[i].class_name)
+
+    # edges are recorded breadth first: the key of the consumer is always known
+    for e in range(graph.edge_count()):
+        source = graph.edge_source[e]
+        if paths[source] is None:
+            paths[source] = _key(paths[graph.edge_target[e]], graph.edge_input[e], graph.edge_output[e], graph.nodes[source].class_name)
+
+    sources = [None] * len(graph)
+    ranks = {}
+    for i in graph.topological_order():
+        inputs = sorted((graph.edge_input[e], graph.edge_output[e], sources[graph.edge_source[e]]) for e in graph.input_edges(i))
+        key = _key(graph.nodes[i].class_name, _settings(graph.nodes[i]), inputs)
+        rank = ranks.get(key, 0)
+        ranks[key] = rank + 1
+        sources[i] = _key(key, rank)
+    return [f"{source} {path}" for source, path in zip(sources, paths)]
+
+def _content_value(value):
+    if isinstance(value, bpy.types.bpy_struct):
+        return (type(value).__name__, getattr(value, "name", None))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (str, bool)) or value is None or not hasattr(value, "__len__"):
+        return value
+    return tuple(_content_value(v) for v in value)
+
+def _settings(node):
+    return [(name, _content_value(optimizer.node_setting(node, name))) for name in sorted(node.own_props)]
+
+def _node_content(node):
+    settings = _settings(node)
+    values = [(s.template.index, _content_value(s.value)) for s in node.used_inputs()
+        if s.value is not None and not _same_value(s.template.default_value, s.value)]
+    # literals of Value and RGB nodes are held by their outputs
+    outputs = [(s.template.index, _content_value(s.value)) for s in node.used_outputs() if s.value is not None]
+    content = [node.class_name, settings, values, outputs]
+    if isinstance(node, GroupNode):
+        content.append(node.group.name)
+    elif isinstance(node, (GroupInputNode, GroupOutputNode)):
+        templates = node.output_templates if isinstance(node, GroupInputNode) else node.input_templates
+        content.append([(t.identifier, t.type, _content_value(t.default_value), t.min_value, t.max_value) for t in templates])
+    return content
+
+def structural_hash(graph, roots):
+    """
+    Returns a hash of the content of the graph built from the given roots: each node is hashed from its
+    class, settings, input and output values together with the hashes of the nodes linked to its inputs,
+    and the hashes of the roots are combined as a set. It does not depend on the order the nodes were
+    created in nor on the session, so identical graphs built by different scripts get the same hash.
+    """
+    linked = [[] for _ in range(len(graph))]
+    for e in range(graph.edge_count()):
+        linked[graph.edge_target[e]].append((graph.edge_input[e], graph.edge_output[e], graph.edge_source[e]))
+
+    hashes = [None] * len(graph)
+    for i in graph.topological_order():
+        inputs = sorted((index, output, hashes[source]) for index, output, source in linked[i])
+        hashes[i] = _key(_node_content(graph.nodes[i]), inputs)
+    return _key(sorted(set(hashes[graph.node_ids[as_node(root)]] for root in roots)))
+
+def _same_value(current, value):
+    """
+    Returns True if an RNA value (stored in single precision) equals the value about to be written.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(current, (int, float)):
+        return math.isclose(current, value, rel_tol=1e-6, abs_tol=1e-7)
+    if isinstance(value, (list, tuple)):
+        try:
+            current = tuple(current)
+        except TypeError:
+            return False
+        return len(current) == len(value) and all(_same_value(c, v) for c, v in zip(current, value))
+    return current == value
+
+def _complete(steps):
+    # runs a generation to the end at once, returns its result
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+class GenerationTask:
+    """
+    Handle on a generation running in time slices from a timer (see NodeGenerator.generate_async).
+    units_done and units_total are the numbers of work units (node creations and link creations) done and to do.
+    The task can be awaited from a coroutine of an asyncio loop stepped alongside Blender.
+    """
+    def __init__(self, steps, time_slice, progress, timers):
+        self.units_done = 0
+        self.units_total = 0
+        self.time_slice = time_slice
+        self.__steps = steps
+        self.__progress = progress
+        self.__timers = timers
+        self.__result = None
+        self.__exception = None
+        self.__finished = False
+        self.__callbacks = []
+        # the timers recognize the callback by identity, the bound method is created once
+        self.__callback = self.__run
+        timers.register(self.__callback, first_interval = 0.0)
+
+    def __run(self):
+        end = time.perf_counter() + self.time_slice
+        try:
+            while True:
+                self.units_done, self.units_total = next(self.__steps)
+                if time.perf_counter() >= end:
+                    break
+        except StopIteration as stop:
+            self.units_done = self.units_total
+            self.__finish(stop.value, None)
+            return None
+        except Exception as exception:
+            self.__finish(None, exception)
+            return None
+        if self.__progress is not None:
+            self.__progress(self.units_done, self.units_total)
+        return 0.0
+
+    def __finish(self, result, exception):
+        self.__result = result
+        self.__exception = exception
+        self.__finished = True
+        if exception is None and self.__progress is not None:
+            self.__progress(self.units_done, self.units_total)
+        for callback in self.__callbacks:
+            callback(self)
+
+    @property
+    def progress(self):
+        """
+        The fraction of the work units done, between 0 and 1.
+        """
+        return self.units_done / self.units_total if self.units_total else float(self.__finished)
+
+    def done(self):
+        return self.__finished
+
+    def cancelled(self):
+        return isinstance(self.__exception, asyncio.CancelledError)
+
+    def cancel(self):
+        """
+        Stops the generation, a detached generation leaves the material untouched.
+        Returns False if the generation was already finished.
+        """
+        if self.__finished:
+            return False
+        if self.__timers.is_registered(self.__callback):
+            self.__timers.unregister(self.__callback)
+        self.__steps.close()
+        self.__finish(None, asyncio.CancelledError())
+        return True
+
+    def result(self):
+        """
+        Returns the generated material, raises the exception of the generation if it failed.
+        """
+        if not self.__finished:
+            raise RuntimeError("The generation is not finished")
+        if self.__exception is not None:
+            raise self.__exception
+        return self.__result
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(task) when the generation finishes (at once if it is already finished).
+        """
+        if self.__finished:
+            callback(self)
+        else:
+            self.__callbacks.append(callback)
+
+    def __await__(self):
+        if not self.__finished:
+            # the awaiting coroutine sleeps until the timer finishes the task
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            def resolve():
+                if not future.done():
+                    future.set_result(None)
+            self.add_done_callback(lambda task: loop.call_soon_threadsafe(resolve))
+            yield from future
+        return self.result()
 
 class NodeGenerator:
+
+    def __init__(self):
+        self.statistics = {}
+        self.__hash_index = None
+        # material name -> LayoutResult of its last incremental generation, keyed by real node names
+        self.__layouts = {}
     
-    def generate(self, nodes, material, replace = True):
-        nodes = self.__to_nodes(nodes)
-        material = self.__get_material(material, replace)
-        real_nodes = self.__generate_node_tree(nodes, material.node_tree)
+    def generate(self, nodes, material, replace = True, fold_constants = False, simplify = False, fuse = False, rebalance = False, layout = None, incremental = False, reuse = False, detached = False):
+        """
+        Generates the node tree of the given nodes (and all their ancestors) in the given material.
+        nodes = a node, a node output or a list of them.
+        material = a material or a material name (created if it does not exist).
+        replace = clears the existing node tree of the material first.
+        fold_constants = evaluates constant Math, VectorMath and combine nodes and bypasses Mix nodes
+        with a constant 0/1 factor before generation (the graph is modified in place).
+        simplify = True to apply the standard algebraic simplifications, or a Simplifier with custom rules.
+        fuse = merges node patterns into fewer nodes (MULTIPLY_ADD, Clamp, single vector scaling...).
+        rebalance = turns long chains of additions, multiplications, minimums or maximums into balanced trees.
+        layout = a NodeLayout (or True for a default one) placing the nodes from the Python-side graph,
+        the locations are then written in a single bulk pass.
+        incremental = updates the node tree of a previous incremental generation instead of rebuilding it:
+        real nodes are matched by a key stored on them (see node_keys), only the missing nodes and links
+        are created, the others are removed and only the values that differ are written.
+        reuse = returns the material generated from an identical graph (see structural_hash) if there is one,
+        instead of generating the tree again; it may be a material with another name. The hash is only
+        computed with reuse and stored on the generated material, so later generations with reuse find it
+        (also after the file is reloaded); a material regenerated without reuse loses its stored hash.
+        detached = builds the tree into a copy of the material (or a new material) and swaps it in at the end:
+        the users of the material are remapped to the copy, which takes its name, so the tree is never seen
+        half built. If the generation raises, the copy is removed and the material is left untouched.
+        The returned material is then a different datablock than the given one.
+        Only the properties and socket values that differ from the defaults of a new node are written.
+        Numbers about the generation are available in the statistics dictionary afterwards
+        (written_values and skipped_values count the property and socket value writes done and avoided).
+        """
+        return _complete(self.__generate(nodes, material, replace, fold_constants, simplify, fuse, rebalance, layout, incremental, reuse, detached))
+
+    def generate_async(self, nodes, material, replace = True, fold_constants = False, simplify = False, fuse = False, rebalance = False, layout = None, incremental = False, reuse = False, detached = True, time_slice = 0.02, progress = None, timers = None):
+        """
+        Same as generate, but the nodes and links are created in slices of at most time_slice seconds
+        run from a timer, so the UI stays responsive. Returns a GenerationTask.
+        detached is True by default, the tree being built would be visible (and editable) between the slices otherwise.
+        progress = called with the numbers of work units done and to do after each slice.
+        timers = the object the slices are registered to, bpy.app.timers by default.
+        """
+        steps = self.__generate(nodes, material, replace, fold_constants, simplify, fuse, rebalance, layout, incremental, reuse, detached)
+        return GenerationTask(steps, time_slice, progress, bpy.app.timers if timers is None else timers)
+
+    def __generate(self, nodes, material, replace, fold_constants, simplify, fuse, rebalance, layout, incremental, reuse, detached):
+        graph = self.__to_graph(nodes, fold_constants, simplify, fuse, rebalance)
+        content_hash = structural_hash(graph, to_roots(nodes)) if reuse else None
+        if reuse:
+            cached = self.__cached('MATERIAL', content_hash)
+            if cached is not None:
+                self.statistics["reused"] = cached.name
+                return cached
+
+        target = self.__find(bpy.data.materials, material) if detached else None
+        if target is not None:
+            material = target.copy()
+        material = self.__get_material(material, replace and not incremental)
+        try:
+            if incremental:
+                keys = node_keys(graph, to_roots(nodes))
+                real_nodes = self.__update_node_tree(graph, keys, material.node_tree)
+                name = material.name if target is None else target.name
+                # the names of the kept real nodes do not change, unlike their keys
+                self.__layout(graph, material.node_tree, layout, real_nodes, [n.name for n in real_nodes], name)
+            else:
+                real_nodes = yield from self.__generate_node_tree(graph, material.node_tree)
+                self.__layout(graph, material.node_tree, layout)
+        except BaseException:
+            if detached:
+                bpy.data.materials.remove(material)
+            raise
+        if target is not None:
+            material = self.__swap(bpy.data.materials, target, material)
+        # a tree generated over existing nodes is not the graph anymore
+        self.__register('MATERIAL', material, content_hash if replace or incremental else None)
         return material
 
-    def generate_group(self, nodes, group):
-        nodes = self.__to_nodes(nodes)
+    def generate_group(self, nodes, group, fold_constants = False, simplify = False, fuse = False, rebalance = False, layout = None, reuse = False, detached = False):
+        graph = self.__to_graph(nodes, fold_constants, simplify, fuse, rebalance)
+        content_hash = structural_hash(graph, to_roots(nodes)) if reuse else None
+        if reuse:
+            cached = self.__cached('GROUP', content_hash)
+            if cached is not None:
+                self.statistics["reused"] = cached.name
+                return cached
+
+        target = self.__find(bpy.data.node_groups, group) if detached else None
+        if target is not None:
+            group = target.copy()
         group = self.__get_group(group)
-        real_nodes = self.__generate_node_tree(nodes, group)
+        try:
+            _complete(self.__generate_node_tree(graph, group))
+            self.__layout(graph, group, layout)
+        except BaseException:
+            if detached:
+                bpy.data.node_groups.remove(group)
+            raise
+        if target is not None:
+            group = self.__swap(bpy.data.node_groups, target, group)
+        self.__register('GROUP', group, content_hash)
         return group
 
-    def __to_nodes(self, nodes):
-        if isinstance(nodes, set) or isinstance(nodes, list):
-            nodes = set(as_node(n) for n in nodes)
-        else:
-            nodes = set((as_node(nodes),))
+    def generate_variants(self, nodes, group, rows, names, fold_constants = False, simplify = False, fuse = False, rebalance = False, layout = None, reuse = False):
+        """
+        Generates one material per row of parameter values from a graph using parameters (see NodeSystem.parameter).
+        The graph is generated once as a node group whose outputs are the links of the material output node,
+        each material then only holds a group node linked to a material output, with the values of its row
+        written to the inputs of the group node.
+        nodes = the material output node of the graph.
+        group = the node group or the name of the node group (created if it does not exist).
+        rows = a list of dictionaries (parameter name -> value) or a NumPy structured array whose field names
+        are parameter names. A parameter missing from a row keeps its default value.
+        names = a list with the name of each material, or a format string given the index and the values of
+        the row (eg "Brick.{index:03d}"). Existing materials are replaced.
+        The other parameters are those of generate_group. Returns the list of materials.
+        """
+        output = as_node(nodes)
+        group_output = GroupOutputNode(output.node_system)
+        linked = [s for s in output.used_inputs() if s.link]
+        for s in linked:
+            group_output.add_input(s.template.identifier, s.link.output.template.type)
+            group_output.get_input(len(group_output.input_templates) - 1).set_value(s.link.output)
+        try:
+            group = self.generate_group(group_output, group, fold_constants, simplify, fuse, rebalance, layout, reuse)
+        finally:
+            for s in group_output.used_inputs():
+                s.unlink()
+
+        if hasattr(rows, "dtype"):
+            # converted by column, tolist keeps the array fields of a structured row as arrays
+            columns = rows.dtype.names
+            rows = [dict(zip(columns, values)) for values in zip(*(rows[c].tolist() for c in columns))]
+        materials = []
+        for i, row in enumerate(rows):
+            name = names.format(index = i, **row) if isinstance(names, str) else names[i]
+            materials.append(self.__make_variant(output, group, row, [s.template.index for s in linked], name))
+        self.statistics["variants"] = len(materials)
+        return materials
+
+    def outline(self, nodes, min_size = 4, name = "Outlined", layout = None):
+        """
+        Hoists the subgraphs repeated in the graphs of the given nodes into shared node groups (see
+        optimizer.repeated_cones): each repeated subgraph is generated once as a node group, with a group
+        input per value it takes from the rest of the graph, and every occurrence is replaced by a group node.
+        nodes = the roots of one or many graphs, eg the output nodes of several materials (possibly built
+        by different node systems). The graphs are modified in place, generate them afterwards.
+        min_size = the smallest number of nodes of an outlined subgraph.
+        name = prefix of the names of the node groups (name.000, name.001...), existing groups are replaced.
+        Returns the list of node groups.
+        """
+        groups = []
+        replaced = 0
+        # consumers that are not reachable from the roots are left alone
+        live = optimizer.LiveLinks(NodeGraph.from_roots(to_roots(nodes)))
+        for cones in optimizer.repeated_cones(nodes, min_size):
+            groups.append(self.__outline(cones, live, f"{name}.{len(groups):03d}", layout))
+            replaced += sum(len(members) for root, members in cones)
+        self.statistics = {"groups": len(groups), "replaced_nodes": replaced}
+        return groups
 
-        parents = set(n for n in nodes)
-        while parents:
-            parents = set(a for p in parents for a in p.get_input_nodes() if a not in nodes)
-            nodes.update(parents)
+    def __outline(self, cones, live, name, layout):
+        # the nodes of the first cone become the content of the group, its parameters come from a group input
+        root, members = cones[0]
+        _, params = optimizer.cone_signature(root, members, live)
+        outputs = optimizer.linked_outputs(root, live)
+        callers = [live.links(o) for o in outputs]
 
-        return nodes
+        group_input = GroupInputNode(root.node_system)
+        for output in params:
+            group_input.add_output(output.template.identifier, output.template.type)
+        param_index = {output: k for k, output in enumerate(params)}
+        for node in members:
+            for input in node.used_inputs():
+                if input.link and input.link.output.node not in members:
+                    input.set_value(group_input.get_output(param_index[input.link.output]))
+
+        group_output = GroupOutputNode(root.node_system)
+        for p, output in enumerate(outputs):
+            group_output.add_input(output.template.identifier, output.template.type)
+            group_output.get_input(p).set_value(output)
+        group = self.generate_group(group_output, name, layout = layout)
+        for input in group_output.used_inputs():
+            input.unlink()
+
+        self.__call_group(root, group, params, callers)
+        for root, members in cones[1:]:
+            _, params = optimizer.cone_signature(root, members, live)
+            self.__call_group(root, group, params, [live.links(o) for o in optimizer.linked_outputs(root, live)])
+        return group
+
+    def __call_group(self, root, group, params, callers):
+        group_node = GroupNode(root.node_system, group)
+        for k, output in enumerate(params):
+            group_node.get_input(k).set_value(output)
+        for p, links in enumerate(callers):
+            for link in links:
+                link.input.set_value(group_node.get_output(p))
+
+    def __make_variant(self, output, group, row, output_inputs, name):
+        group_node = GroupNode(output.node_system, group)
+        inputs = {t.identifier: t.index for t in group_node.input_templates}
+        for parameter, value in row.items():
+            index = inputs.get(parameter)
+            if index is None:
+                raise ValueError("unknown parameter: " + parameter)
+            group_node.get_input(index).set_value(value)
+
+        material = self.__get_material(name, True)
+        node_tree = material.node_tree
+        real_group = self.__make_real_node(group_node, node_tree)
+        real_output = self.__make_real_node(output, node_tree)
+        for index, input_index in enumerate(output_inputs):
+            node_tree.links.new(real_output.inputs[input_index], real_group.outputs[index])
+        real_output.location = (real_group.width + COLUMN_SPACING, 0.0)
+        return material
+
+    def __cached(self, kind, content_hash):
+        """
+        Returns the material or node group (kind 'MATERIAL' or 'GROUP') generated from a graph with the
+        given hash, None if there is none. The index is read from the hashes stored on the datablocks.
+        """
+        datablock = self.__lookup(kind, content_hash)
+        if datablock is None:
+            # the datablock may have been generated by another generator or loaded from a file since the last scan
+            self.__scan_hashes()
+            datablock = self.__lookup(kind, content_hash)
+        return datablock
+
+    def __lookup(self, kind, content_hash):
+        if self.__hash_index is None:
+            return None
+        datablock = self.__hash_index.get((kind, content_hash))
+        try:
+            # the datablock may have been regenerated from another graph or removed since
+            if datablock is not None and datablock.get(HASH_PROPERTY) == content_hash:
+                return datablock
+        except ReferenceError:
+            pass
+        return None
+
+    def __scan_hashes(self):
+        self.__hash_index = {}
+        for kind, datablocks in (('MATERIAL', bpy.data.materials), ('GROUP', bpy.data.node_groups)):
+            for datablock in datablocks:
+                stored = datablock.get(HASH_PROPERTY)
+                if stored is not None:
+                    self.__hash_index[(kind, stored)] = datablock
+
+    def __register(self, kind, datablock, content_hash):
+        if content_hash is None:
+            if HASH_PROPERTY in datablock:
+                del datablock[HASH_PROPERTY]
+            return
+        datablock[HASH_PROPERTY] = content_hash
+        if self.__hash_index is not None:
+            self.__hash_index[(kind, content_hash)] = datablock
+
+    def __to_graph(self, nodes, fold_constants, simplify, fuse, rebalance):
+        roots = to_roots(nodes)
+        self.statistics = {}
+        if fold_constants:
+            self.statistics["folded_nodes"] = optimizer.fold_constants(roots)
+        if simplify:
+            simplifier = simplify if isinstance(simplify, optimizer.Simplifier) else optimizer.Simplifier()
+            self.statistics["simplified_nodes"] = simplifier.simplify(roots)
+        if fuse:
+            self.statistics["fused_nodes"], self.statistics["fused_patterns"] = optimizer.fuse(roots)
+        if rebalance:
+            self.statistics["rebalanced_chains"] = optimizer.rebalance(roots)
+        graph = NodeGraph.from_roots(roots)
+        self.statistics["nodes"] = len(graph)
+        self.statistics["links"] = graph.edge_count()
+        self.statistics["written_values"] = 0
+        self.statistics["skipped_values"] = 0
+        return graph
 
     def __get_material(self, material, replace):
         if isinstance(material, bpy.types.Material):
@@ -44,6 +520,18 @@ class NodeGenerator:
     
         return material
 
+    def __find(self, datablocks, datablock):
+        name = datablock if isinstance(datablock, str) else datablock.name
+        return datablocks[name] if name in datablocks else None
+
+    def __swap(self, datablocks, target, built):
+        # every material, object or group node using the target uses the built datablock from now on
+        name = target.name
+        target.user_remap(built)
+        datablocks.remove(target)
+        built.name = name
+        return built
+
     def __get_group(self, group):
         if isinstance(group, bpy.types.ShaderNodeTree):
             group = group.name
@@ -59,29 +547,110 @@ class NodeGenerator:
 
         return group
         
-    def __generate_node_tree(self, nodes, node_tree):
-        links = [i.link for n in nodes for i in n.inputs if i.link]
-        
-        nodes_to_real_nodes = dict()
-        for node in nodes:
-            real_node = self.__make_real_node(node, node_tree)
-            nodes_to_real_nodes[node] = real_node
-
-        for link in links:
-            input = link.input
-            output = link.output
-            input_node = nodes_to_real_nodes[input.node]
-            output_node = nodes_to_real_nodes[output.node]
-            real_input = input_node.inputs[input.template.index]
-            real_output = output_node.outputs[output.template.index]
-            node_tree.links.new(real_input, real_output)
+    def __generate_node_tree(self, graph, node_tree):
+        # yields the numbers of work units done and to do after each one, a unit being a node or a link
+        total = len(graph.nodes) + graph.edge_count()
+        real_nodes = []
+        for node in graph.nodes:
+            real_nodes.append(self.__make_real_node(node, node_tree))
+            yield len(real_nodes), total
+
+        links = node_tree.links
+        for e in range(graph.edge_count()):
+            real_output = real_nodes[graph.edge_source[e]].outputs[graph.edge_output[e]]
+            real_input = real_nodes[graph.edge_target[e]].inputs[graph.edge_input[e]]
+            links.new(real_input, real_output)
+            yield len(real_nodes) + e + 1, total
         
-        return nodes_to_real_nodes.values()
+        return real_nodes
+
+    def __layout(self, graph, node_tree, layout, real_nodes = None, keys = None, name = None):
+        if not layout:
+            return
+        if layout is True:
+            layout = NodeLayout()
+        if keys is None:
+            locations = layout.layout_graph(graph).locations
+        else:
+            # the nodes kept from the previous generation keep their place, see NodeLayout.layout
+            result = layout.layout_graph(graph, previous = self.__layouts.get(name), keys = keys)
+            self.__layouts[name] = result
+            self.statistics["moved_nodes"] = result.moved
+            locations = result.locations
+        if real_nodes is None:
+            # the generated nodes are the last ones of the tree, in graph order
+            write_locations(node_tree.nodes, locations)
+        else:
+            positions = {n.name: i for i, n in enumerate(node_tree.nodes)}
+            write_locations(node_tree.nodes, locations, [positions[n.name] for n in real_nodes])
+
+    def __update_node_tree(self, graph, keys, node_tree):
+        real_nodes = node_tree.nodes
+        # the nodes are matched by source key first, the ones left by path key (see node_keys)
+        stored = [(real_node, str(real_node.get(KEY_PROPERTY, "")).split(" ")) for real_node in real_nodes]
+        matched = [None] * len(keys)
+        taken = set()
+        for part in (0, 1):
+            existing = {key[part]: real_node for real_node, key in stored if len(key) == 2}
+            for i, (node, key) in enumerate(zip(graph.nodes, keys)):
+                real_node = existing.get(key.split(" ")[part])
+                if matched[i] is None and real_node is not None and real_node.name not in taken and self.__is_same_kind(node, real_node):
+                    matched[i] = real_node
+                    taken.add(real_node.name)
+        removed = [real_node for real_node, key in stored if real_node.name not in taken]
+
+        result = []
+        created = set()
+        for i, (node, key) in enumerate(zip(graph.nodes, keys)):
+            real_node = matched[i]
+            if real_node is None:
+                real_node = self.__make_real_node(node, node_tree)
+                created.add(i)
+            else:
+                self.__write_values(node, real_node, True)
+            if real_node.get(KEY_PROPERTY) != key:
+                real_node[KEY_PROPERTY] = key
+            result.append(real_node)
+        for real_node in removed:
+            real_nodes.remove(real_node)
+
+        # links of the kept nodes are kept when they are still wanted, the missing ones are created
+        wanted_links = {}
+        for e in range(graph.edge_count()):
+            wanted_links[(graph.edge_target[e], graph.edge_input[e])] = (graph.edge_source[e], graph.edge_output[e])
+        ids = {real_node.name: i for i, real_node in enumerate(result)}
+        links = node_tree.links
+        removed_links = 0
+        for target, real_node in enumerate(result):
+            if target in created:
+                continue
+            for index, socket in enumerate(real_node.inputs):
+                for link in list(socket.links):
+                    source_node = link.from_node
+                    source = ids.get(source_node.name)
+                    output = [s.identifier for s in source_node.outputs].index(link.from_socket.identifier)
+                    if wanted_links.get((target, index)) == (source, output):
+                        del wanted_links[(target, index)]
+                    else:
+                        links.remove(link)
+                        removed_links += 1
+        for (target, index), (source, output) in wanted_links.items():
+            links.new(result[target].inputs[index], result[source].outputs[output])
+
+        self.statistics["created_nodes"] = len(created)
+        self.statistics["removed_nodes"] = len(removed)
+        self.statistics["created_links"] = len(wanted_links)
+        self.statistics["removed_links"] = removed_links
+        return result
+
+    def __is_same_kind(self, node, real_node):
+        if real_node.bl_idname != node.class_name:
+            return False
+        return not isinstance(node, GroupNode) or real_node.node_tree == node.group
 
     def __group_io(self, template, io):
-        socket = io.new("NodeSocket" + template.type, template.identifier)
+        socket = io.new("NodeSocket" + SOCKET_CLASS_SUFFIXES.get(template.type, template.type), template.identifier)
         if template.default_value is not None:
-            print(template.type, template.identifier, template.default_value)
             socket.default_value = template.default_value
         if template.min_value is not None:
             socket.min_value = template.min_value
@@ -92,31 +661,80 @@ class NodeGenerator:
         real_node = node_tree.nodes.new(node.class_name)
 
         if isinstance(node, GroupInputNode):
-            for o in node.outputs:
-                self.__group_io(o.template, node_tree.inputs)
+            for template in node.output_templates:
+                self.__group_io(template, node_tree.inputs)
         elif isinstance(node, GroupOutputNode):
-            for i in node.inputs:
-                self.__group_io(i.template, node_tree.outputs)
+            for template in node.input_templates:
+                self.__group_io(template, node_tree.outputs)
         else:
+            self.__write_values(node, real_node, False)
 
-            for prop in node.own_props:
-                try:
-                    value = getattr(node, prop)
-                    setattr(real_node, prop, value)
-                except:
-                    pass
+        return real_node
 
-            for ri, i in zip(real_node.inputs, node.inputs):
-                if i.value is not None:
-                    ri.default_value = self.__checked_value(i, i.value)
-            for ro, o in zip(real_node.outputs, node.outputs):
-                if o.value is not None:
-                    ro.default_value = self.__checked_value(o, o.value)
+    def __write_values(self, node, real_node, compare):
+        """
+        Writes the properties and socket values of the node that differ from the values of a new real node
+        (the defaults captured in the catalog). When compare is True the real node was generated before:
+        every value is compared with the real one instead, so that the values reset to their default are
+        written too.
+        """
+        if isinstance(node, (GroupInputNode, GroupOutputNode)):
+            return
 
-            if isinstance(node, GroupNode):
-                real_node.node_tree = node.group
+        for prop, default in node.own_props.items():
+            value = optimizer.node_setting(node, prop)
+            if value is None:
+                continue
+            try:
+                current = getattr(real_node, prop) if compare else default
+            except AttributeError:
+                continue
+            if _same_value(current, value):
+                self.statistics["skipped_values"] += 1
+            else:
+                self.__write_property(real_node, prop, value)
 
-        return real_node
+        if isinstance(node, GroupNode) and (not compare or real_node.node_tree != node.group):
+            real_node.node_tree = node.group
+
+        if compare:
+            self.__update_values(node.input_templates, node.used_inputs(), real_node.inputs)
+            self.__update_values(node.output_templates, node.used_outputs(), real_node.outputs)
+        else:
+            self.__write_socket_values(node.used_inputs(), real_node.inputs)
+            self.__write_socket_values(node.used_outputs(), real_node.outputs)
+
+    def __write_property(self, real_node, prop, value):
+        try:
+            setattr(real_node, prop, value)
+            self.statistics["written_values"] += 1
+        except (AttributeError, TypeError, ValueError):
+            # eg an enum item or a pointer this Blender version does not accept
+            pass
+
+    def __write_socket_values(self, sockets, real_sockets):
+        for s in sockets:
+            if s.value is None:
+                continue
+            value = self.__checked_value(s, s.value)
+            if _same_value(s.template.default_value, value):
+                self.statistics["skipped_values"] += 1
+            else:
+                real_sockets[s.template.index].default_value = value
+                self.statistics["written_values"] += 1
+
+    def __update_values(self, templates, used, real_sockets):
+        values = {s.template.index: self.__checked_value(s, s.value) for s in used if s.value is not None}
+        for template in templates:
+            value = values.get(template.index, template.default_value)
+            if value is None:
+                continue
+            real_socket = real_sockets[template.index]
+            if _same_value(real_socket.default_value, value):
+                self.statistics["skipped_values"] += 1
+            else:
+                real_socket.default_value = value
+                self.statistics["written_values"] += 1
 
     def __checked_value(self, input, value):
         if input.template.type == 'RGBA':
@@ -0,0 +1,146 @@
+from array import array
+
+from nodes_for_python.nodes import as_node
+
+class NodeGraph:
+    """
+    Compact snapshot of a node graph.
+    Node i is nodes[i] (the BaseNode used to author it) and its node class is class_names[class_ids[i]].
+    Edge e links output edge_output[e] of node edge_source[e] to input edge_input[e] of node edge_target[e].
+    Adjacency is indexed on demand in CSR form so traversals only touch integer arrays.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.node_ids = {}
+        self.class_names = []
+        self.class_ids = array('i')
+        self.edge_source = array('i')
+        self.edge_output = array('i')
+        self.edge_target = array('i')
+        self.edge_input = array('i')
+        self.__class_name_ids = {}
+        self.__in_index = None
+        self.__out_index = None
+
+    @staticmethod
+    def from_roots(roots):
+        """
+        Builds the graph of the given nodes and all their ancestors.
+        roots = iterable of nodes or node outputs.
+        """
+        graph = NodeGraph()
+        for root in roots:
+            graph.add_node(as_node(root))
+
+        i = 0
+        while i < len(graph.nodes):
+            for input in graph.nodes[i].used_inputs():
+                link = input.link
+                if link:
+                    output = link.output
+                    source = graph.add_node(output.node)
+                    graph.add_edge(source, output.template.index, i, input.template.index)
+            i += 1
+
+        return graph
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, node):
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.nodes.append(node)
+            self.node_ids[node] = node_id
+            class_id = self.__class_name_ids.get(node.class_name)
+            if class_id is None:
+                class_id = len(self.class_names)
+                self.class_names.append(node.class_name)
+                self.__class_name_ids[node.class_name] = class_id
+            self.class_ids.append(class_id)
+            self.__in_index = None
+            self.__out_index = None
+        return node_id
+
+    def add_edge(self, source, output_index, target, input_index):
+        self.edge_source.append(source)
+        self.edge_output.append(output_index)
+        self.edge_target.append(target)
+        self.edge_input.append(input_index)
+        self.__in_index = None
+        self.__out_index = None
+
+    def edge_count(self):
+        return len(self.edge_source)
+
+    def input_edges(self, node_id):
+        """
+        Returns the ids of the edges ending at the given node.
+        """
+        if self.__in_index is None:
+            self.__in_index = self.__make_index(self.edge_target)
+        offsets, edges = self.__in_index
+        return edges[offsets[node_id]:offsets[node_id + 1]]
+
+    def output_edges(self, node_id):
+        """
+        Returns the ids of the edges starting from the given node.
+        """
+        if self.__out_index is None:
+            self.__out_index = self.__make_index(self.edge_source)
+        offsets, edges = self.__out_index
+        return edges[offsets[node_id]:offsets[node_id + 1]]
+
+    def topological_order(self):
+        """
+        Returns the node ids ordered so that every node comes after the nodes linked to its inputs.
+        Raises ValueError if the graph contains a cycle.
+        """
+        in_degree = array('i', [0]) * len(self.nodes)
+        for target in self.edge_target:
+            in_degree[target] += 1
+
+        order = array('i', (i for i in range(len(self.nodes)) if in_degree[i] == 0))
+        head = 0
+        while head < len(order):
+            for e in self.output_edges(order[head]):
+                target = self.edge_target[e]
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    order.append(target)
+            head += 1
+
+        if len(order) != len(self.nodes):
+            raise ValueError("node graph contains a cycle")
+        return order
+
+    def ancestors(self, node_ids):
+        """
+        Returns the set of ids of the given nodes and of all the nodes they depend on.
+        """
+        seen = bytearray(len(self.nodes))
+        stack = list(node_ids)
+        for i in stack: seen[i] = 1
+        while stack:
+            for e in self.input_edges(stack.pop()):
+                source = self.edge_source[e]
+                if not seen[source]:
+                    seen[source] = 1
+                    stack.append(source)
+        return set(i for i in range(len(self.nodes)) if seen[i])
+
+    def __make_index(self, keys):
+        offsets = array('i', [0]) * (len(self.nodes) + 1)
+        for k in keys:
+            offsets[k + 1] += 1
+        for i in range(len(self.nodes)):
+            offsets[i + 1] += offsets[i]
+
+        fill = array('i', offsets)
+        edges = array('i', [0]) * len(keys)
+        for e, k in enumerate(keys):
+            edges[fill[k]] = e
+            fill[k] += 1
+        return offsets, edges
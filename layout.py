@@ -1,7 +1,19 @@
 import bpy
+import time
 from mathutils import Vector
 from collections import defaultdict
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from nodes_for_python.graph import NodeGraph
+
+COLUMN_SPACING = 50
+DUMMY_SIZE = 20
+FRAME_PADDING = 40
+
 def _get_nodes(nodes):
     if isinstance(nodes, bpy.types.Material):
         return nodes.node_tree.nodes
@@ -9,110 +21,667 @@ def _get_nodes(nodes):
         return nodes.nodes
     return nodes
 
+def _links(nodes, ids):
+    """
+    Returns the (source, target, input index) tuples of the links between the given nodes, read once from RNA.
+    """
+    result = []
+    for target, node in enumerate(nodes):
+        for input_index, socket in enumerate(node.inputs):
+            for link in socket.links:
+                source = ids.get(link.from_node)
+                if source is not None:
+                    result.append((source, target, input_index))
+    return result
+
+def _longest_path_columns(count, links):
+    """
+    Returns the column of each node id: 0 for the nodes without linked outputs, otherwise one less
+    than the leftmost column of the nodes they are linked to. Computed in a single topological pass
+    from the sinks; raises ValueError if the links contain a cycle.
+    """
+    producers = [[] for _ in range(count)]
+    pending = [0] * count
+    for source, target, _ in links:
+        producers[target].append(source)
+        pending[source] += 1
+
+    cols = [0] * count
+    ready = [i for i in range(count) if pending[i] == 0]
+    placed = 0
+    while ready:
+        target = ready.pop()
+        placed += 1
+        col = cols[target] - 1
+        for source in producers[target]:
+            if col < cols[source]:
+                cols[source] = col
+            pending[source] -= 1
+            if pending[source] == 0:
+                ready.append(source)
+
+    if placed != count:
+        raise ValueError("cannot lay out the nodes: their links contain a cycle")
+    return cols
+
+class _LayeredGraph:
+    """
+    Nodes assigned to layers (left to right), with the links spanning several layers split by dummy
+    vertices so that every edge joins adjacent layers. The long links of a node share one chain of
+    dummies, so their number grows with the nodes rather than with the links. Vertices 0..count-1 are the nodes, the others
+    are dummies. upper[v] and lower[v] hold the (neighbour, port offset) pairs of v in the layers on
+    its left and right, the port offset in [0, 1) orders the links entering the same node by input.
+    """
+
+    def __init__(self, count, cols, links):
+        first = min(cols, default=0)
+        self.count = count
+        self.layer_of = [c - first for c in cols]
+        self.upper = [[] for _ in range(count)]
+        self.lower = [[] for _ in range(count)]
+
+        slots = [1] * count
+        for _, target, input_index in links:
+            slots[target] = max(slots[target], input_index + 1)
+
+        chains = {}
+        for source, target, input_index in links:
+            port = input_index / slots[target]
+            span = self.layer_of[target] - self.layer_of[source] - 1
+            chain = chains.setdefault(source, [])
+            while len(chain) < span:
+                u = chain[-1] if chain else source
+                d = len(self.layer_of)
+                self.layer_of.append(self.layer_of[source] + 1 + len(chain))
+                self.upper.append([(u, 0.0)])
+                self.lower.append([])
+                self.lower[u].append((d, 0.0))
+                chain.append(d)
+            u = chain[span - 1] if span > 0 else source
+            self.lower[u].append((target, port))
+            self.upper[target].append((u, 0.0))
+
+        self.layers = [[] for _ in range(1 - first)] if count else []
+        for v, layer in enumerate(self.layer_of):
+            self.layers[layer].append(v)
+
+    def is_dummy(self, v):
+        return v >= self.count
+
+def _positions(layers, vertex_count):
+    pos = [0] * vertex_count
+    for layer in layers:
+        for i, v in enumerate(layer):
+            pos[v] = i
+    return pos
+
+def _sort_layer(layer, neighbours, pos):
+    """
+    Reorders the layer by the median (then barycenter) position of the neighbours of each vertex;
+    vertices without neighbours keep their position.
+    """
+    keys = {}
+    for v in layer:
+        values = sorted(pos[w] + port for w, port in neighbours[v])
+        n = len(values)
+        if n == 0:
+            keys[v] = (pos[v], pos[v])
+        else:
+            median = values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+            keys[v] = (median, sum(values) / n)
+    layer.sort(key=keys.__getitem__)
+    for i, v in enumerate(layer):
+        pos[v] = i
+
+def _count_crossings(layers, lower, pos):
+    """
+    Counts the crossings between each pair of adjacent layers by counting the inversions of the
+    edge endpoints with an accumulator tree (O(E log V)).
+    """
+    crossings = 0
+    for k in range(len(layers) - 1):
+        size = len(layers[k + 1])
+        tree = [0] * (size + 1)
+        seen = 0
+        for u in layers[k]:
+            for p in sorted(pos[w] for w, _ in lower[u]):
+                i = p + 1
+                not_above = 0
+                while i > 0:
+                    not_above += tree[i]
+                    i -= i & -i
+                crossings += seen - not_above
+                i = p + 1
+                while i <= size:
+                    tree[i] += 1
+                    i += i & -i
+                seen += 1
+    return crossings
+
+def _minimize_crossings(graph, deadline, max_sweeps = 24, patience = 4):
+    """
+    Orders the vertices inside each layer with alternate right-to-left and left-to-right median sweeps,
+    keeping the order with the fewest crossings found before the deadline.
+    """
+    layers = graph.layers
+    pos = _positions(layers, len(graph.layer_of))
+    best = [list(layer) for layer in layers]
+    best_crossings = None
+    stale = 0
+
+    for sweep in range(max_sweeps):
+        if sweep % 2 == 0:
+            for k in range(len(layers) - 2, -1, -1):
+                _sort_layer(layers[k], graph.lower, pos)
+        else:
+            for k in range(1, len(layers)):
+                _sort_layer(layers[k], graph.upper, pos)
+
+        crossings = _count_crossings(layers, graph.lower, pos)
+        if best_crossings is None or crossings < best_crossings:
+            best = [list(layer) for layer in layers]
+            best_crossings = crossings
+            stale = 0
+        else:
+            stale += 1
+        if crossings == 0 or stale >= patience or time.perf_counter() > deadline:
+            break
+
+    graph.layers = best
+
+def _fit_layer(targets, sizes):
+    """
+    Returns the tops closest (least squares) to the targets that keep each vertex below the previous
+    one: tops[i] <= tops[i - 1] - sizes[i - 1]. Solved as an isotonic regression by pooling adjacent
+    violators.
+    """
+    offsets = []
+    offset = 0.0
+    for size in sizes:
+        offsets.append(offset)
+        offset += size
+
+    blocks = []
+    for target, offset in zip(targets, offsets):
+        total, count = target + offset, 1
+        while blocks and blocks[-1][0] / blocks[-1][1] < total / count:
+            t, c = blocks.pop()
+            total += t
+            count += c
+        blocks.append((total, count))
+
+    tops = []
+    for total, count in blocks:
+        tops.extend([total / count] * count)
+    return [top - offset for top, offset in zip(tops, offsets)]
+
+def _stacked_tops(graph, sizes):
+    """
+    Returns the top of each vertex when the vertices of each layer are stacked in order and the layer
+    is centered on y = 0.
+    """
+    if numpy is None:
+        tops = [0.0] * len(graph.layer_of)
+        for layer in graph.layers:
+            y = sum(sizes[v] for v in layer) / 2
+            for v in layer:
+                tops[v] = y
+                y -= sizes[v]
+        return tops
+
+    # vertices sorted by layer then order, so each layer is a contiguous run
+    vertices = numpy.fromiter((v for layer in graph.layers for v in layer), dtype=numpy.intp, count=len(graph.layer_of))
+    layer_of = numpy.asarray(graph.layer_of, dtype=numpy.intp)[vertices]
+    stacked = numpy.asarray(sizes, dtype=float)[vertices]
+    starts = numpy.searchsorted(layer_of, numpy.arange(len(graph.layers)))
+    above = numpy.cumsum(stacked) - stacked
+    above -= above[starts][layer_of]
+    totals = numpy.add.reduceat(stacked, starts)
+
+    tops = numpy.empty(len(vertices))
+    tops[vertices] = totals[layer_of] / 2 - above
+    return tops.tolist()
+
+def _column_xs(graph, widths):
+    """
+    Returns the x of each layer: the rightmost one is at 0 and each layer ends COLUMN_SPACING
+    before the next one, its width being the widest of its nodes.
+    """
+    if numpy is None:
+        xs = [0.0] * len(graph.layers)
+        x = 0.0
+        for k in range(len(graph.layers) - 1, -1, -1):
+            xs[k] = x
+            if k > 0:
+                x -= COLUMN_SPACING + max((widths[v] for v in graph.layers[k - 1] if not graph.is_dummy(v)), default=0)
+        return xs
+
+    layer_widths = numpy.zeros(len(graph.layers))
+    numpy.maximum.at(layer_widths, numpy.asarray(graph.layer_of[:graph.count], dtype=numpy.intp), numpy.asarray(widths, dtype=float))
+    steps = COLUMN_SPACING + layer_widths
+    steps[-1] = 0.0
+    return -numpy.cumsum(steps[::-1])[::-1]
+
+def _compact_coordinates(graph, sizes, deadline, passes = 4):
+    """
+    Returns the top of each vertex: layers are stacked and centered, then each vertex is pulled
+    toward the center of its neighbours, alternating right-to-left and left-to-right passes.
+    """
+    tops = _stacked_tops(graph, sizes)
+
+    layers = graph.layers
+    for p in range(passes):
+        if time.perf_counter() > deadline:
+            break
+        if p % 2 == 0:
+            order, neighbours = range(len(layers) - 2, -1, -1), graph.lower
+        else:
+            order, neighbours = range(1, len(layers)), graph.upper
+        for k in order:
+            layer = layers[k]
+            targets = []
+            for v in layer:
+                adjacent = neighbours[v]
+                if adjacent:
+                    center = sum(tops[w] - sizes[w] / 2 for w, _ in adjacent) / len(adjacent)
+                    targets.append(center + sizes[v] / 2)
+                else:
+                    targets.append(tops[v])
+            for v, top in zip(layer, _fit_layer(targets, [sizes[v] for v in layer])):
+                tops[v] = top
+    return tops
+
+def _layered_layout(widths, sizes, links, time_budget, minimize_crossings = True, compact = True):
+    """
+    Returns the (x, y) location of each node given their widths, their vertical sizes (spacing included)
+    and their (source, target, input index) links, as an (n, 2) array when NumPy is available.
+    The crossing minimization and the coordinate compaction stop early once time_budget seconds are spent.
+    """
+    deadline = time.perf_counter() + time_budget
+    count = len(widths)
+    if count == 0:
+        return []
+    graph = _LayeredGraph(count, _longest_path_columns(count, links), links)
+    if minimize_crossings:
+        _minimize_crossings(graph, deadline)
+
+    sizes = list(sizes) + [DUMMY_SIZE] * (len(graph.layer_of) - count)
+    tops = _compact_coordinates(graph, sizes, deadline, 4 if compact else 0)
+    xs = _column_xs(graph, widths)
+
+    if numpy is None:
+        return [(xs[graph.layer_of[i]], tops[i]) for i in range(count)]
+    locations = numpy.empty((count, 2))
+    locations[:, 0] = xs[numpy.asarray(graph.layer_of[:count], dtype=numpy.intp)]
+    locations[:, 1] = tops[:count]
+    return locations
+
+class _Occupancy:
+    """
+    Rects (x0, x1, top, size) of the placed nodes, bucketed by x so that the nodes a rect may
+    overlap are found without scanning all of them.
+    """
+    BUCKET = 256.0
+
+    def __init__(self):
+        self.rects = {}
+        self.buckets = defaultdict(set)
+
+    def __range(self, x0, x1):
+        return range(int(x0 // self.BUCKET), int(x1 // self.BUCKET) + 1)
+
+    def add(self, i, x0, x1, top, size):
+        self.rects[i] = (x0, x1, top, size)
+        for b in self.__range(x0, x1):
+            self.buckets[b].add(i)
+
+    def remove(self, i):
+        rect = self.rects.pop(i, None)
+        if rect is not None:
+            for b in self.__range(rect[0], rect[1]):
+                self.buckets[b].discard(i)
+
+    def free_top(self, x0, x1, top, size):
+        """
+        Returns the top closest to the given one at which a rect of the given size does not overlap
+        any of the rects sharing part of the [x0, x1] range.
+        """
+        ids = set().union(*(self.buckets.get(b, ()) for b in self.__range(x0, x1)))
+        blocking = [(t, t - s) for rx0, rx1, t, s in (self.rects[i] for i in ids) if rx0 < x1 and x0 < rx1]
+        candidates = [top] + [bottom for _, bottom in blocking] + [t + size for t, _ in blocking]
+        for candidate in sorted(candidates, key=lambda c: abs(c - top)):
+            if all(candidate <= bottom or candidate - size >= t for t, bottom in blocking):
+                return candidate
+        return top
+
+def _shift_producers(widths, sizes, links, locations, max_moved):
+    """
+    Returns the locations of the nodes and the number of nodes placed, keeping the location (None
+    for new nodes) of every node whose consumers are still on its right. The other nodes are placed
+    left of their consumers, next to the median of their centers and clear of the other nodes.
+    Nodes are visited from the sinks so that a moved node pushes the producers it would overlap.
+    Returns None as soon as more than max_moved nodes have to be placed.
+    """
+    count = len(widths)
+    cols = _longest_path_columns(count, links)
+    consumers = [[] for _ in range(count)]
+    for source, target, _ in links:
+        consumers[source].append(target)
+
+    locations = list(locations)
+    occupancy = _Occupancy()
+    right = -COLUMN_SPACING
+    for i, l in enumerate(locations):
+        if l is not None:
+            occupancy.add(i, l[0], l[0] + widths[i], l[1], sizes[i])
+            right = max(right, l[0] + widths[i])
+
+    moved = 0
+    for i in sorted(range(count), key=cols.__getitem__, reverse=True):
+        targets = consumers[i]
+        limit = min(locations[t][0] for t in targets) - COLUMN_SPACING - widths[i] if targets else None
+        location = locations[i]
+        if location is not None and (limit is None or location[0] <= limit):
+            continue
+
+        moved += 1
+        if moved > max_moved:
+            return None
+        if targets:
+            x = limit
+            centers = sorted(locations[t][1] - sizes[t] / 2 for t in targets)
+            top = centers[len(centers) // 2] + sizes[i] / 2
+        else:
+            x = right + COLUMN_SPACING
+            top = 0.0
+        occupancy.remove(i)
+        top = occupancy.free_top(x, x + widths[i], top, sizes[i])
+        locations[i] = (x, top)
+        occupancy.add(i, x, x + widths[i], top, sizes[i])
+
+    return locations, moved
+
+def _incremental_layout(widths, sizes, links, locations):
+    """
+    Returns the locations of the nodes and the number of nodes placed, starting from their previous
+    locations (None for new nodes): the edited nodes either push their producers to the left or, with the same method
+    on the mirrored graph, their consumers to the right, whichever moves fewer nodes.
+    Returns None when both would move more than a quarter of the nodes.
+    """
+    left = _shift_producers(widths, sizes, links, locations, len(widths) // 4)
+    if left is not None and left[1] <= 1:
+        return left
+
+    mirrored_links = [(target, source, input_index) for source, target, input_index in links]
+    mirrored = [None if l is None else (-l[0] - w, l[1]) for l, w in zip(locations, widths)]
+    right = _shift_producers(widths, sizes, mirrored_links, mirrored, len(widths) // 4 if left is None else left[1] - 1)
+    if right is None:
+        return left
+    mirrored, moved = right
+    return [(-l[0] - w, l[1]) for l, w in zip(mirrored, widths)], moved
+
+class LayoutStrategy:
+    """
+    How NodeLayout places a graph, or the nodes of a frame: nodes are assigned to columns by longest
+    path, then optionally ordered to reduce link crossings and pulled toward their neighbours.
+    Subclasses can override locations to place the nodes differently.
+    minimize_crossings = orders each column by median sweeps instead of keeping the node order.
+    compact = aligns nodes with their neighbours instead of only stacking and centering the columns.
+    """
+
+    def __init__(self, minimize_crossings = True, compact = True):
+        self.minimize_crossings = minimize_crossings
+        self.compact = compact
+
+    def locations(self, widths, sizes, links, time_budget):
+        """
+        Returns the (x, y) location of each node given their widths, their vertical sizes (spacing
+        included) and their (source, target, input index) links.
+        """
+        return _layered_layout(widths, sizes, links, time_budget, self.minimize_crossings, self.compact)
+
+SIMPLE_LAYERING = LayoutStrategy(minimize_crossings = False, compact = False)
+CROSSING_MINIMIZED = LayoutStrategy(compact = False)
+COMPACT = LayoutStrategy()
+
+class LayoutResult:
+    """
+    Locations computed by NodeLayout, which can be given back as previous to lay out an edited
+    version of the same nodes incrementally.
+    keys = the key of each node: its name for real nodes, the BaseNode itself for graphs.
+    locations = the (x, y) location of each node, in the order of keys.
+    extents = the (width, vertical size) of each node, in the order of keys.
+    links = the set of (source key, target key, input index) links laid out.
+    moved = the number of nodes placed (all of them unless the layout was incremental).
+    frames = the LayoutResult of the frames and unframed nodes (keyed by frame), None without frames.
+    """
+
+    def __init__(self, keys, locations, extents, links, moved, frames = None):
+        self.keys = keys
+        self.locations = locations
+        self.extents = extents
+        self.links = links
+        self.moved = moved
+        self.frames = frames
+        self.__index = None
+
+    def __lookup(self, key):
+        if self.__index is None:
+            self.__index = {k: i for i, k in enumerate(self.keys)}
+        return self.__index.get(key)
+
+    def location(self, key):
+        """
+        Returns the location of the node with the given key, None if it was not laid out.
+        """
+        i = self.__lookup(key)
+        return None if i is None else tuple(self.locations[i])
+
+    def extent(self, key):
+        i = self.__lookup(key)
+        return None if i is None else self.extents[i]
+
+def _layout_result(keys, widths, sizes, links, time_budget, previous, strategy):
+    key_links = set((keys[source], keys[target], input_index) for source, target, input_index in links)
+    extents = list(zip(widths, sizes))
+    if previous is not None:
+        # resized nodes are placed again like new ones
+        previous_locations = [previous.location(k) if previous.extent(k) == e else None for k, e in zip(keys, extents)]
+        new_count = previous_locations.count(None)
+        if key_links == previous.links and new_count == 0:
+            return LayoutResult(keys, previous_locations, extents, key_links, 0)
+        # small edits only: a mostly new graph is laid out from scratch
+        if 2 * new_count <= len(keys):
+            incremental = _incremental_layout(widths, sizes, links, previous_locations)
+            if incremental is not None:
+                return LayoutResult(keys, incremental[0], extents, key_links, incremental[1])
+    locations = strategy.locations(widths, sizes, links, time_budget)
+    return LayoutResult(keys, locations, extents, key_links, len(keys))
+
+class _FrameLayout:
+    """
+    Layout of the nodes of a frame relative to the top left corner of the frame, with the signature
+    of the nodes and links it was computed for.
+    """
+
+    def __init__(self, signature, locations, extents):
+        self.signature = signature
+        x0 = min(x for x, _ in locations)
+        top = max(y for _, y in locations)
+        self.width = max(x + w for (x, _), (w, _) in zip(locations, extents)) - x0 + 2 * FRAME_PADDING
+        self.size = top - min(y - s for (_, y), (_, s) in zip(locations, extents)) + 2 * FRAME_PADDING
+        self.offsets = [(x - x0 + FRAME_PADDING, y - top - FRAME_PADDING) for x, y in locations]
+
+def _compound_layout(keys, frames, widths, sizes, links, time_budget, previous, strategy, cache):
+    """
+    Lays out each frame (frames[i] = key of the frame of node i, None outside frames) on its own,
+    reusing the cached layout of the frames whose nodes and inner links did not change, then lays out
+    the frames as single blocks together with the unframed nodes.
+    """
+    members = defaultdict(list)
+    for i, frame in enumerate(frames):
+        if frame is not None:
+            members[frame].append(i)
+    if not members:
+        return _layout_result(keys, widths, sizes, links, time_budget, previous, strategy)
+
+    inner_links = defaultdict(list)
+    outer_links = []
+    for link in links:
+        frame = frames[link[0]]
+        if frame is not None and frame == frames[link[1]]:
+            inner_links[frame].append(link)
+        else:
+            outer_links.append(link)
+
+    vertex_keys, vertex_widths, vertex_sizes = [], [], []
+    vertex_of = [0] * len(keys)
+    for i, frame in enumerate(frames):
+        if frame is None:
+            vertex_of[i] = len(vertex_keys)
+            vertex_keys.append(keys[i])
+            vertex_widths.append(widths[i])
+            vertex_sizes.append(sizes[i])
+
+    moved = 0
+    frame_layouts = {}
+    for frame, ids in members.items():
+        local = {i: j for j, i in enumerate(ids)}
+        local_links = [(local[s], local[t], k) for s, t, k in inner_links[frame]]
+        signature = ([keys[i] for i in ids], [(widths[i], sizes[i]) for i in ids], local_links)
+        frame_layout = cache.get(frame)
+        if frame_layout is None or frame_layout.signature != signature:
+            locations = strategy.locations([widths[i] for i in ids], [sizes[i] for i in ids], local_links, time_budget)
+            frame_layout = _FrameLayout(signature, locations, signature[1])
+            cache[frame] = frame_layout
+            moved += len(ids)
+        frame_layouts[frame] = frame_layout
+        for i in ids:
+            vertex_of[i] = len(vertex_keys)
+        vertex_keys.append(frame)
+        vertex_widths.append(frame_layout.width)
+        vertex_sizes.append(frame_layout.size)
+
+    vertex_links = [(vertex_of[s], vertex_of[t], k) for s, t, k in outer_links]
+    try:
+        outer = _layout_result(vertex_keys, vertex_widths, vertex_sizes, vertex_links, time_budget,
+            previous.frames if previous is not None else None, strategy)
+    except ValueError:
+        # the frames are linked both ways: they cannot be placed as blocks
+        return _layout_result(keys, widths, sizes, links, time_budget, previous, strategy)
+
+    locations = [None] * len(keys)
+    for i, frame in enumerate(frames):
+        if frame is None:
+            locations[i] = tuple(outer.locations[vertex_of[i]])
+    for frame, ids in members.items():
+        x, y = outer.locations[vertex_of[ids[0]]]
+        for i, (dx, dy) in zip(ids, frame_layouts[frame].offsets):
+            locations[i] = (x + dx, y + dy)
+
+    key_links = set((keys[source], keys[target], input_index) for source, target, input_index in links)
+    return LayoutResult(keys, locations, list(zip(widths, sizes)), key_links, moved + outer.moved, outer)
+
+def write_locations(real_nodes, locations, indices = None):
+    """
+    Writes locations into a node collection in one bulk pass.
+    indices = the index in the collection of the node of each location, None for the last len(locations) nodes.
+    """
+    if len(locations) == 0:
+        return
+    start = len(real_nodes) - len(locations)
+    if numpy is None:
+        flat = [0.0] * (2 * len(real_nodes))
+        real_nodes.foreach_get("location", flat)
+        for i, (x, y) in enumerate(locations):
+            index = start + i if indices is None else indices[i]
+            flat[2 * index] = x
+            flat[2 * index + 1] = y
+    else:
+        flat = numpy.empty((len(real_nodes), 2), dtype=numpy.float32)
+        real_nodes.foreach_get("location", flat.ravel())
+        if indices is None:
+            flat[start:] = locations
+        else:
+            flat[numpy.asarray(indices, dtype=numpy.intp)] = locations
+        flat = flat.ravel()
+    real_nodes.foreach_set("location", flat)
+
+def _node_size(height, hidden, hidden_size):
+    return 100 if hidden and hidden_size else (2 * height + 100)
+
+def _frame_of(node):
+    parent = node.parent
+    return parent.name if parent is not None and parent.bl_idname == 'NodeFrame' else None
+
 class NodeLayout:
+    """
+    Places nodes in columns following their links, with the given LayoutStrategy (SIMPLE_LAYERING,
+    CROSSING_MINIMIZED or COMPACT). Framed nodes are laid out as one block per frame, and the
+    layout of each frame is kept to be reused as long as its nodes and inner links do not change.
+    """
+
+    def __init__(self, strategy = COMPACT):
+        self.strategy = strategy
+        self.__frame_layouts = {}
     
-    def layout(self, nodes, hidden = False, hidden_size = False):
+    def layout(self, nodes, hidden = False, hidden_size = False, time_budget = 1.0, previous = None):
+        """
+        Arranges the nodes in columns following their links. Returns a LayoutResult.
+        nodes = a material, a node tree or a collection of nodes.
+        time_budget = seconds after which the crossing reduction and the compaction stop improving the layout.
+        previous = the LayoutResult of a previous layout of the same nodes (identified by name): the nodes
+        still consistent with their links keep their location and only the others are placed.
+        """
         
-        nodes = _get_nodes(nodes)
+        nodes = [n for n in _get_nodes(nodes) if n.bl_idname != 'NodeFrame']
 
         for n in nodes: n.hide = hidden
-        
-        cols = {n:0 for n in nodes}
-        
-        all_placed = False
-        while not all_placed:
-            all_placed = True
-            for n in nodes:
-                col_min = self.__min_col(cols, n)
-                if cols[n] >= col_min:
-                    cols[n] = col_min - 1
-                    all_placed = False
-
-        by_col = defaultdict(list)
-        for n, col in cols.items():
-            by_col[col].append(n)
-
-        cols = sorted(by_col.keys(), reverse=True)
-
-        widths = [50 + max(n.width for n in by_col[c]) for c in cols]
-        x = widths[0]
-        for i, c in enumerate(cols):
-            x -= widths[i]
-            for n in by_col[c]: n.location.x = x
-            
-        for col in cols:
-            col_nodes = by_col[col]
-            col_indices = [self.__avg_input_index(n) for n in col_nodes]
-            indices = [i for i in range(len(col_nodes))]
-            indices = sorted(indices, key=lambda i: col_indices[i])
-            y = 0
-            for i in indices:
-                node = col_nodes[i]
-                node.location.y = y
-                delta = 100 if hidden and hidden_size else (2 * node.height + 100)
-                y = node.location.y - delta
-
-        for col in cols:
-            col_nodes = by_col[col]
-            height = abs(sum(n.location.y for n in col_nodes) / len(col_nodes))
-            for n in col_nodes:
-                n.location.y += height
-            
-    def layout2(self, nodes, hidden = False, hidden_size = False):
-        
-        for n in nodes: n.hide = hidden
-        
-        cols = {n:0 for n in nodes}
-        
-        all_placed = False
-        while not all_placed:
-            all_placed = True
-            for n in nodes:
-                col_min = self.__min_col(cols, n)
-                if cols[n] >= col_min:
-                    cols[n] = col_min - 1
-                    all_placed = False
-
-        by_col = defaultdict(list)
-        for n, col in cols.items():
-            by_col[col].append(n)
-
-        cols = sorted(by_col.keys(), reverse=True)
-
-        widths = [50 + max(n.width for n in by_col[c]) for c in cols]
-        x = widths[0]
-        for i, c in enumerate(cols):
-            x -= widths[i]
-            for n in by_col[c]: n.location.x = x
-            
-        for col in cols:
-            col_nodes = by_col[col]
-            col_indices = [self.__avg_input_index(n) for n in col_nodes]
-            indices = [i for i in range(len(col_nodes))]
-            indices = sorted(indices, key=lambda i: col_indices[i])
-            y = 0
-            for i in indices:
-                node = col_nodes[i]
-                node.location.y = y
-                delta = 100 if hidden and hidden_size else (2 * node.height + 100)
-                y = node.location.y - delta
-
-        for col in cols:
-            col_nodes = by_col[col]
-            height = abs(sum(n.location.y for n in col_nodes) / len(col_nodes))
-            for n in col_nodes:
-                n.location.y += height
-            
-    def __no_ouputs(self, node):
-        return sum(len(o.links) for o in node.outputs) == 0
 
-    def __min_output_x(self, node):
-        return min((l.to_node.location.x for o in node.outputs for l in o.links), default=0)
+        ids = {n: i for i, n in enumerate(nodes)}
+        widths = [n.width for n in nodes]
+        sizes = [_node_size(n.height, hidden, hidden_size) for n in nodes]
+        result = _compound_layout([n.name for n in nodes], [_frame_of(n) for n in nodes], widths, sizes,
+            _links(nodes, ids), time_budget, previous, self.strategy, self.__frame_layouts)
 
-    def __min_col(self, cols, node):
-        return min((cols[l.to_node] for o in node.outputs for l in o.links), default=0)
+        # framed nodes are located relative to their frame, placed at the top left of its block
+        frame_nodes = {n.parent.name: n.parent for n in nodes if _frame_of(n) is not None}
+        if result.frames is not None:
+            for name, frame in frame_nodes.items():
+                frame.location = result.frames.location(name)
+        for n, (x, y) in zip(nodes, result.locations):
+            frame = frame_nodes.get(_frame_of(n))
+            if frame is not None:
+                x, y = x - frame.location[0], y - frame.location[1]
+            n.location = (x, y)
+        return result
+            
+    def layout_graph(self, nodes, hidden = False, hidden_size = False, time_budget = 1.0, previous = None, keys = None):
+        """
+        Lays out a NodeGraph on the Python side from the default node sizes of the catalog, so that no real
+        node is needed. Returns a LayoutResult whose locations are in node id order.
+        Nodes sharing a frame (see NodeSystem.frame) are laid out as a block.
+        nodes = a NodeGraph, or nodes / node outputs whose graph is laid out.
+        previous = the LayoutResult of a previous layout of the same nodes, see layout.
+        keys = the key of each node of the graph, the BaseNode objects by default. Keys that do not depend on
+        the BaseNode objects (eg generator.node_keys) let previous come from a graph built again; frames are
+        then keyed by the smallest key of their nodes.
+        """
+        graph = nodes if isinstance(nodes, NodeGraph) else NodeGraph.from_roots(nodes if isinstance(nodes, (list, set, tuple)) else [nodes])
+        widths = [n.layout_size[0] for n in graph.nodes]
+        sizes = [_node_size(n.layout_size[1], hidden, hidden_size) for n in graph.nodes]
+        links = list(zip(graph.edge_source, graph.edge_target, graph.edge_input))
+        frames = [n.frame for n in graph.nodes]
+        if keys is None:
+            keys = list(graph.nodes)
+        else:
+            frame_keys = {}
+            for frame, key in zip(frames, keys):
+                if frame is not None and (frame not in frame_keys or key < frame_keys[frame]):
+                    frame_keys[frame] = key
+            frames = [None if frame is None else ("frame", frame_keys[frame]) for frame in frames]
+        return _compound_layout(keys, frames, widths, sizes, links,
+            time_budget, previous, self.strategy, self.__frame_layouts)
 
-    def __avg_input_index(self, node):
-        indices = [l.to_socket.getIndex() for o in node.outputs for l in o.links]
-        return sum(indices) / len(indices) if indices else 0
-        
+    def layout2(self, nodes, hidden = False, hidden_size = False, time_budget = 1.0, previous = None):
+        return self.layout(nodes, hidden, hidden_size, time_budget, previous)
@@ -9,6 +9,8 @@ def as_node(x):
     return x.node if isinstance(x, NodeIO) else x
 
 class NodeIOTemplate:
+    __slots__ = ('index', 'name', 'identifier', 'type', 'default_value', 'min_value', 'max_value')
+
     def __init__(self, index, name, identifier, type, default_value):
         self.index = index
         self.name = name
@@ -19,6 +21,7 @@ class NodeIOTemplate:
         self.max_value = None
 
 class NodeInputTemplate(NodeIOTemplate):
+    __slots__ = ('i_name',)
     
     def __init__(self, index, name, identifier, type, default_value):
         super().__init__(index, name, identifier, type, default_value)
@@ -28,6 +31,7 @@ class NodeInputTemplate(NodeIOTemplate):
         return 'InputTemplate(name='+self.name+')'
 
 class NodeOutputTemplate(NodeIOTemplate):
+    __slots__ = ('o_name',)
     
     def __init__(self, index, name, identifier, type, default_value):
         super().__init__(index, name, identifier, type, default_value)
@@ -43,17 +47,22 @@ class NodeOutputTemplate(NodeIOTemplate):
         return self.type == 'VALUE'
 
 class NodeLink:
+    __slots__ = ('input', 'output')
+
     def __init__(self, input, output):
         self.input = input
         self.output = output
 
 class NodeIO:
+    __slots__ = ('node', 'template', 'value')
+
     def __init__(self, node, template):
         self.node = node
         self.template = template
         self.value = None
 
 class NodeInput(NodeIO):
+    __slots__ = ('link',)
     
     def __init__(self, node, template):
         super().__init__(node, template)
@@ -68,6 +77,13 @@ class NodeInput(NodeIO):
             self.__add_link(as_output(value))
         else:
             self.value = value
+
+    def unlink(self):
+        """
+        Removes the link connected to this input, if any.
+        """
+        self.__remove_link()
+        self.link = None
                 
     def __remove_link(self):
         if self.link:
@@ -76,17 +92,28 @@ class NodeInput(NodeIO):
 
     def __add_link(self, output):
         self.link = NodeLink(self, output)
-        output.links.append(self.link)
+        if output.links:
+            output.links.append(self.link)
+        else:
+            output.links = [self.link]
 
 class NodeOutput(NodeIO):
+    __slots__ = ('links',)
     
     def __init__(self, node, template):
         super().__init__(node, template)
-        self.links = []
+        self.links = ()
 
     def __str__(self):
         return 'Output('+self.template.name+')'
 
+    def redirect(self, other):
+        """
+        Connects every input linked to this output to the other output instead.
+        """
+        for link in list(self.links):
+            link.input.set_value(other)
+
     def __add__(self, other):
         ns = self.node.node_system
         
@@ -107,7 +134,12 @@ class NodeOutput(NodeIO):
             return ns.math_substract(self, other)
 
     def __rsub__(self, other):
-        return (self * -1) + other
+        ns = self.node.node_system
+
+        if self.template.is_vector_type():
+            return ns.vector_substract(other, self)
+        else:
+            return ns.math_substract(other, self)
     
     def __mul__(self, other):
         ns = self.node.node_system
@@ -207,34 +239,90 @@ class NodeOutput(NodeIO):
         ns = self.node.node_system        
         return ns.math_power(self, other)
 
-class BaseNode:    
-    def __init__(self):
-        self.inputs = [NodeInput(self, t) for t in self.input_templates]
-        self.outputs = [NodeOutput(self, t) for t in self.output_templates]
+def make_input_index(templates):
+    index = {t.name: t.index for t in templates}
+    index.update((t.i_name, t.index) for t in templates)
+    return index
 
-        for i in self.inputs:
-            self.__dict__[i.template.i_name] = i
+def make_output_index(templates):
+    index = {t.name: t.index for t in templates}
+    index.update((t.o_name, t.index) for t in templates)
+    return index
 
-        for o in self.outputs:
-            self.__dict__[o.template.o_name] = o
-            self.__dict__[o.template.name] = o
+class BaseNode:    
+    input_templates = []
+    output_templates = []
+    input_index = {}
+    output_index = {}
+    # default (width, height) of the real node, used to lay out the graph before generation
+    layout_size = (140.0, 100.0)
 
+    def __init__(self):
+        self.__inputs = {}
+        self.__outputs = {}
         self.frame = None
 
     def __setattr__(self, name, value):
-        if getattr(self, "inputs", None):
-            for i in self.inputs:
-                if i.template.name == name or i.template.i_name == name:
-                    i.set_value(value)
-                    return
-
-        self.__dict__[name] = value
+        index = self.input_index.get(name)
+        if index is None:
+            self.__dict__[name] = value
+        else:
+            self.get_input(index).set_value(value)
+
+    def __getattr__(self, name):
+        index = self.output_index.get(name)
+        if index is not None:
+            return self.get_output(index)
+        index = self.input_index.get(name)
+        if index is not None:
+            return self.get_input(index)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def inputs(self):
+        return [self.get_input(i) for i in range(len(self.input_templates))]
+
+    @property
+    def outputs(self):
+        return [self.get_output(i) for i in range(len(self.output_templates))]
+
+    def get_input(self, index):
+        """
+        Returns the input socket at the given index, creating it on first access.
+        """
+        socket = self.__inputs.get(index)
+        if socket is None:
+            socket = NodeInput(self, self.input_templates[index])
+            self.__inputs[index] = socket
+        return socket
+
+    def get_output(self, index):
+        """
+        Returns the output socket at the given index, creating it on first access.
+        """
+        socket = self.__outputs.get(index)
+        if socket is None:
+            socket = NodeOutput(self, self.output_templates[index])
+            self.__outputs[index] = socket
+        return socket
+
+    def used_inputs(self):
+        """
+        Returns the input sockets accessed so far, the only ones that can hold a value or a link.
+        """
+        return list(self.__inputs.values())
+
+    def used_outputs(self):
+        """
+        Returns the output sockets accessed so far, the only ones that can hold a value or links.
+        """
+        return list(self.__outputs.values())
 
     def __str__(self):
         return self.__class__.__name__
     
     def get_input_nodes(self):
-        return [i.link.output.node for i in self.inputs if i.link]
+        return [i.link.output.node for i in self.used_inputs() if i.link]
 
     def __first_output(self):
         return self.o0
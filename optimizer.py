@@ -0,0 +1,792 @@
+import bpy
+from collections import defaultdict
+
+from nodes_for_python.nodes import *
+from nodes_for_python.graph import NodeGraph
+from nodes_for_python.evaluate import *
+
+def frozen_value(value):
+    if isinstance(value, (NodeOutput, BaseNode)):
+        return as_output(value)
+    if isinstance(value, (str, bpy.types.bpy_struct)) or not hasattr(value, "__len__"):
+        return value
+    return tuple(frozen_value(v) for v in value)
+
+def to_roots(nodes):
+    return list(nodes) if isinstance(nodes, (list, set, tuple)) else [nodes]
+
+def builder_key(node_name, settings, values):
+    """
+    Returns the key identifying a node built by NodeSystem from its node name, its settings
+    (a tuple of hashable values) and the values given to its first inputs (None for unset inputs).
+    """
+    return (node_name, settings, tuple((i, frozen_value(v)) for i, v in enumerate(values) if v is not None))
+
+def matches_builder_key(node, key):
+    """
+    Returns True if the node built for the key (see builder_key) still has the operation and input
+    values of the key, False once an optimizer pass or a script changed them.
+    """
+    node_name, settings, values = key
+    if settings is not None and node_setting(node, "operation") != settings:
+        return False
+    expected = dict(values)
+    for input in node.used_inputs():
+        value = expected.get(input.template.index)
+        if isinstance(value, NodeOutput):
+            if not input.link or input.link.output is not value:
+                return False
+        elif input.link or frozen_value(input.value) != value:
+            return False
+    return True
+
+def is_mergeable(node):
+    class_name = node.class_name
+    return class_name.startswith("ShaderNode") and not class_name.startswith("ShaderNodeOutput")
+
+def node_key(node):
+    """
+    Returns a key such that two nodes with the same key compute the same outputs: same class,
+    properties, frame, input links and input values (unset values and defaults being equivalent).
+    Returns None for nodes that must not be merged (group inputs/outputs, frames, output nodes).
+    """
+    if not is_mergeable(node):
+        return None
+
+    props = tuple((k, frozen_value(node.__dict__.get(k, v))) for k, v in sorted(node.own_props.items()))
+
+    inputs = []
+    for i in sorted(node.used_inputs(), key=lambda i: i.template.index):
+        if i.link:
+            inputs.append((i.template.index, i.link.output))
+        elif i.value is not None and frozen_value(i.value) != frozen_value(i.template.default_value):
+            inputs.append((i.template.index, frozen_value(i.value)))
+
+    outputs = tuple((o.template.index, frozen_value(o.value))
+        for o in sorted(node.used_outputs(), key=lambda o: o.template.index) if o.value is not None)
+
+    return (node.class_name, getattr(node, "group", None), props, node.frame, tuple(inputs), outputs)
+
+def eliminate_common_subexpressions(nodes):
+    """
+    Merges the nodes computing the same thing in the graph of the given nodes: consumers of a
+    duplicate are relinked to the first equivalent node, leaving the duplicate unreachable.
+    nodes = a node, a node output or a list of them (the roots of the graph, never merged).
+    Returns the number of nodes removed from the graph.
+    """
+    roots = to_roots(nodes)
+    graph = NodeGraph.from_roots(roots)
+    root_ids = set(graph.node_ids[as_node(r)] for r in roots)
+
+    live = LiveLinks(graph)
+    canonical = {}
+    removed = 0
+    for node_id in graph.topological_order():
+        if node_id in root_ids:
+            continue
+        node = graph.nodes[node_id]
+        key = node_key(node)
+        if key is None:
+            continue
+        existing = canonical.get(key)
+        if existing is None:
+            canonical[key] = node
+        else:
+            for output in node.used_outputs():
+                for link in live.links(output):
+                    link.input.set_value(existing.get_output(output.template.index))
+            live.release(node)
+            removed += 1
+
+    return removed
+
+def node_setting(node, name):
+    return node.__dict__.get(name, node.own_props.get(name))
+
+def input_value(node, index):
+    """
+    Returns the value of an unlinked input (its default when unset), None when the input is linked.
+    """
+    socket = node.get_input(index)
+    if socket.link:
+        return None
+    return socket.value if socket.value is not None else socket.template.default_value
+
+class LiveLinks:
+    """
+    Tells the links still used in a graph being rewritten: the links to the nodes of the graph built from
+    the roots of the pass and to the nodes added since, leaving out the nodes bypassed by a rewrite.
+    Links to nodes a script holds without linking them to the roots, or left behind by an earlier
+    rewrite, are not counted, and those nodes are never modified.
+    """
+    def __init__(self, graph):
+        self.__node_ids = graph.node_ids
+        self.__added = set()
+        self.__dead = set()
+
+    def is_live(self, node):
+        return (node in self.__node_ids or node in self.__added) and node not in self.__dead
+
+    def links(self, output):
+        """
+        Returns the links leaving output to live nodes.
+        """
+        return [link for link in output.links if self.is_live(link.input.node)]
+
+    def add(self, node):
+        """
+        Marks a node built by a rewrite, and the nodes it was built from, as live.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node in self.__node_ids or node in self.__added:
+                continue
+            self.__added.add(node)
+            stack.extend(input.link.output.node for input in node.used_inputs() if input.link)
+
+    def release(self, node):
+        """
+        Marks the node as bypassed if none of its outputs is linked to a live node, then does the same
+        for the nodes linked to its inputs.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if not self.is_live(node) or any(self.links(o) for o in node.used_outputs()):
+                continue
+            self.__dead.add(node)
+            stack.extend(input.link.output.node for input in node.used_inputs() if input.link)
+
+def replace_with_value(output, value, live):
+    """
+    Replaces the live links leaving output (see LiveLinks) by the given constant value on the linked
+    inputs. Links to inputs that cannot hold the value are kept, as well as links to group outputs
+    whose input values are not generated. Returns True if every link was replaced.
+    """
+    replaced = True
+    for link in live.links(output):
+        input = link.input
+        converted = None if input.node.class_name == "NodeGroupOutput" else convert_value(value, input.template.type)
+        if converted is None:
+            replaced = False
+        else:
+            input.unlink()
+            input.value = converted
+    return replaced
+
+def replace_with_input(output, input, live):
+    """
+    Makes the live consumers of output use whatever feeds the given input of the same node instead.
+    """
+    if input.link:
+        for link in live.links(output):
+            link.input.set_value(input.link.output)
+    elif input.template.type == 'SHADER':
+        for link in live.links(output):
+            link.input.unlink()
+    else:
+        replace_with_value(output, input_value(input.node, input.template.index), live)
+
+def _fold_math(node, live):
+    operation = node_setting(node, "operation")
+    if operation not in MATH_OPERATIONS:
+        return
+    used = MATH_OPERATIONS[operation][0]
+    values = [input_value(node, i) if i in used else 0.0 for i in range(3)]
+    if None in values:
+        return
+    result = evaluate_math(operation, *values, use_clamp = node_setting(node, "use_clamp"))
+    if result is not None:
+        replace_with_value(node.get_output(0), result, live)
+
+def _fold_vector_math(node, live):
+    operation = node_setting(node, "operation")
+    if operation not in VECTOR_MATH_OPERATIONS:
+        return
+    used = VECTOR_MATH_OPERATIONS[operation][0]
+    values = [input_value(node, i) if i in used else 0.0 for i in range(4)]
+    if None in values:
+        return
+    result = evaluate_vector_math(operation, as_vector(values[0]), as_vector(values[1]), as_vector(values[2]), values[3])
+    if result is not None:
+        for output in node.used_outputs():
+            replace_with_value(output, result[output.template.index], live)
+
+def _fold_combine(node, live):
+    values = [input_value(node, i) for i in range(3)]
+    if None in values:
+        return
+    result = evaluate_combine(node.class_name, node_setting(node, "mode"), *values)
+    if result is not None:
+        replace_with_value(node.get_output(0), result, live)
+
+def _mix_sockets(node):
+    if node.class_name == 'ShaderNodeMixShader':
+        return 0, 1, 2, 0, True
+    if node.class_name == 'ShaderNodeMixRGB':
+        if node_setting(node, "use_clamp"):
+            return None
+        return 0, 1, 2, 0, node_setting(node, "blend_type") == 'MIX'
+    data_type = node_setting(node, "data_type")
+    if data_type == 'FLOAT':
+        return 0, 2, 3, 0, True
+    if data_type == 'VECTOR':
+        factor = 1 if node_setting(node, "factor_mode") == 'NON_UNIFORM' else 0
+        return factor, 4, 5, 1, True
+    if data_type == 'RGBA' and not node_setting(node, "clamp_result"):
+        return 0, 6, 7, 2, node_setting(node, "blend_type") == 'MIX'
+    return None
+
+def _fold_mix(node, live):
+    sockets = _mix_sockets(node)
+    if sockets is None:
+        return
+    factor, a, b, output, can_select_b = sockets
+    value = input_value(node, factor)
+    if value is None:
+        return
+    value = set(as_vector(value))
+    if value == {0.0}:
+        replace_with_input(node.get_output(output), node.get_input(a), live)
+    elif value == {1.0} and can_select_b:
+        replace_with_input(node.get_output(output), node.get_input(b), live)
+
+CONSTANT_FOLDERS = {
+    'ShaderNodeMath': _fold_math,
+    'ShaderNodeVectorMath': _fold_vector_math,
+    'ShaderNodeCombineXYZ': _fold_combine,
+    'ShaderNodeCombineRGB': _fold_combine,
+    'ShaderNodeCombineHSV': _fold_combine,
+    'ShaderNodeCombineColor': _fold_combine,
+    'ShaderNodeMixShader': _fold_mix,
+    'ShaderNodeMixRGB': _fold_mix,
+    'ShaderNodeMix': _fold_mix,
+}
+
+def fold_constants(nodes):
+    """
+    Evaluates Math, VectorMath and combine nodes whose inputs are all constant and writes their result
+    on the inputs they were linked to. Mix and MixShader nodes whose factor is exactly 0 or 1 are
+    bypassed. Nodes are visited in topological order so folded values propagate down the graph.
+    nodes = a node, a node output or a list of them (the roots of the graph, never folded).
+    Returns the number of nodes removed from the graph.
+    """
+    roots = to_roots(nodes)
+    graph = NodeGraph.from_roots(roots)
+    root_ids = set(graph.node_ids[as_node(r)] for r in roots)
+    live = LiveLinks(graph)
+
+    for node_id in graph.topological_order():
+        folder = CONSTANT_FOLDERS.get(graph.nodes[node_id].class_name)
+        if folder and node_id not in root_ids:
+            folder(graph.nodes[node_id], live)
+
+    return len(graph) - len(NodeGraph.from_roots(roots))
+
+def input_operand(node, index):
+    """
+    Returns the output linked to an input, or its constant value when it is not linked.
+    """
+    socket = node.get_input(index)
+    return socket.link.output if socket.link else input_value(node, index)
+
+def is_constant(operand, value):
+    if operand is None or isinstance(operand, NodeOutput):
+        return False
+    if isinstance(operand, (int, float)):
+        return operand == value
+    return all(x == value for x in operand[:3])
+
+def source_node(operand, class_name, operation):
+    """
+    Returns the node producing operand if it is of the given class and operation, None otherwise.
+    """
+    if isinstance(operand, NodeOutput):
+        node = operand.node
+        if node.class_name == class_name and node_setting(node, "operation") == operation:
+            return node
+    return None
+
+def replace_output(output, replacement, live):
+    """
+    Makes the live consumers of output use replacement (a node output or a constant value) instead.
+    Returns True if at least one link was changed.
+    """
+    links = live.links(output)
+    if not links:
+        return False
+    if isinstance(replacement, NodeOutput):
+        if replacement is output or replacement.template.type != output.template.type:
+            return False
+        for link in links:
+            link.input.set_value(replacement)
+        return True
+    replace_with_value(output, replacement, live)
+    return len(live.links(output)) != len(links)
+
+class RewriteRule:
+    """
+    A peephole rewrite of one output of the nodes of a class (and operation, None for any).
+    rewrite(node, live) returns what the output can be replaced with (an output, possibly of a newly
+    built node, or a constant value) or None when the rule does not apply to this node. live is the
+    LiveLinks of the pass, fan-out checks only count the consumers it reports.
+    name = the name the rule is counted under in Simplifier.applied.
+    """
+    def __init__(self, class_name, operation, rewrite, output_index = 0, name = None):
+        self.class_name = class_name
+        self.operation = operation
+        self.rewrite = rewrite
+        self.output_index = output_index
+        self.name = name or f"{class_name}.{operation}"
+
+class Simplifier:
+    """
+    Applies rewrite rules to a node graph until none of them applies anymore.
+    The standard rules (STANDARD_RULES) remove algebraic identities of Math and VectorMath nodes,
+    more rules can be added with add_rule.
+    After simplify, applied maps rule names to the number of times they were applied.
+    """
+
+    def __init__(self, rules = None):
+        self.rules = {}
+        self.applied = {}
+        for rule in (STANDARD_RULES if rules is None else rules):
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        self.rules.setdefault((rule.class_name, rule.operation), []).append(rule)
+
+    def simplify(self, nodes, max_passes = 100):
+        """
+        Rewrites the graph of the given nodes in place.
+        nodes = a node, a node output or a list of them (the roots of the graph, never rewritten).
+        Returns the number of nodes removed from the graph.
+        """
+        roots = to_roots(nodes)
+        self.applied = {}
+        before = len(NodeGraph.from_roots(roots))
+        for _ in range(max_passes):
+            if not self.__simplify_pass(roots):
+                break
+        return before - len(NodeGraph.from_roots(roots))
+
+    def __simplify_pass(self, roots):
+        graph = NodeGraph.from_roots(roots)
+        live = LiveLinks(graph)
+        root_ids = set(graph.node_ids[as_node(r)] for r in roots)
+        changed = False
+        for node_id in graph.topological_order():
+            node = graph.nodes[node_id]
+            if node_id not in root_ids and live.is_live(node):
+                changed = self.__apply_rules(node, live) or changed
+        return changed
+
+    def __apply_rules(self, node, live):
+        rules = self.rules.get((node.class_name, node_setting(node, "operation")), []) + self.rules.get((node.class_name, None), [])
+        for rule in rules:
+            output = node.get_output(rule.output_index)
+            if live.links(output):
+                replacement = rule.rewrite(node, live)
+                if replacement is None:
+                    continue
+                if isinstance(replacement, NodeOutput):
+                    live.add(replacement.node)
+                if replace_output(output, replacement, live):
+                    live.release(node)
+                    self.applied[rule.name] = self.applied.get(rule.name, 0) + 1
+                    return True
+                if isinstance(replacement, NodeOutput):
+                    live.release(replacement.node)
+        return False
+
+def _unclamped(rewrite):
+    return lambda node, live: None if node_setting(node, "use_clamp") else rewrite(node, live)
+
+def _identity(index, other, value):
+    """
+    Returns a rewrite replacing a node by its input index when the input other is the constant value.
+    """
+    def rewrite(node, live):
+        if is_constant(input_operand(node, other), value):
+            return input_operand(node, index)
+        return None
+    return rewrite
+
+def _same_operands(node, live):
+    a = input_operand(node, 0)
+    return a if isinstance(a, NodeOutput) and a is input_operand(node, 1) else None
+
+def _idempotent(class_name, operation):
+    """
+    Returns a rewrite replacing f(f(x)) by f(x).
+    """
+    def rewrite(node, live):
+        a = input_operand(node, 0)
+        return a if source_node(a, class_name, operation) is not None else None
+    return rewrite
+
+def _negated(operand, live):
+    node = source_node(operand, 'ShaderNodeMath', 'MULTIPLY')
+    if node is None or node_setting(node, "use_clamp") or len(live.links(operand)) != 1:
+        return None
+    if is_constant(input_operand(node, 1), -1):
+        return input_operand(node, 0)
+    if is_constant(input_operand(node, 0), -1):
+        return input_operand(node, 1)
+    return None
+
+def _double_negation(node, live):
+    for index, other in ((0, 1), (1, 0)):
+        if is_constant(input_operand(node, other), -1):
+            inner = _negated(input_operand(node, index), live)
+            if inner is not None:
+                return inner
+    return None
+
+def _subtract_negation(node, live):
+    for index, other in ((0, 1), (1, 0)):
+        negated = _negated(input_operand(node, index), live)
+        if negated is not None:
+            return build_node(node.node_system, "Math", {"operation": 'SUBTRACT'}, (input_operand(node, other), negated)).o0
+    return None
+
+def _scale_twice_by_minus_one(node, live):
+    inner = source_node(input_operand(node, 0), 'ShaderNodeVectorMath', 'SCALE')
+    if inner is not None and is_constant(input_operand(node, 3), -1) and is_constant(input_operand(inner, 3), -1):
+        return input_operand(inner, 0)
+    return None
+
+STANDARD_RULES = [
+    RewriteRule('ShaderNodeMath', 'ADD', _unclamped(_identity(0, 1, 0))),
+    RewriteRule('ShaderNodeMath', 'ADD', _unclamped(_identity(1, 0, 0))),
+    RewriteRule('ShaderNodeMath', 'ADD', _unclamped(_subtract_negation)),
+    RewriteRule('ShaderNodeMath', 'SUBTRACT', _unclamped(_identity(0, 1, 0))),
+    RewriteRule('ShaderNodeMath', 'SUBTRACT', _unclamped(lambda node, live: 0.0 if _same_operands(node, live) else None)),
+    RewriteRule('ShaderNodeMath', 'MULTIPLY', _unclamped(_identity(0, 1, 1))),
+    RewriteRule('ShaderNodeMath', 'MULTIPLY', _unclamped(_identity(1, 0, 1))),
+    RewriteRule('ShaderNodeMath', 'MULTIPLY', _unclamped(_double_negation)),
+    RewriteRule('ShaderNodeMath', 'DIVIDE', _unclamped(_identity(0, 1, 1))),
+    RewriteRule('ShaderNodeMath', 'POWER', _unclamped(_identity(0, 1, 1))),
+    RewriteRule('ShaderNodeMath', 'POWER', lambda node, live: 1.0 if is_constant(input_operand(node, 1), 0) else None),
+    RewriteRule('ShaderNodeMath', 'MINIMUM', _unclamped(_same_operands)),
+    RewriteRule('ShaderNodeMath', 'MAXIMUM', _unclamped(_same_operands)),
+    RewriteRule('ShaderNodeMath', 'ABSOLUTE', _unclamped(_idempotent('ShaderNodeMath', 'ABSOLUTE'))),
+    RewriteRule('ShaderNodeVectorMath', 'ADD', _identity(0, 1, 0)),
+    RewriteRule('ShaderNodeVectorMath', 'ADD', _identity(1, 0, 0)),
+    RewriteRule('ShaderNodeVectorMath', 'SUBTRACT', _identity(0, 1, 0)),
+    RewriteRule('ShaderNodeVectorMath', 'MULTIPLY', _identity(0, 1, 1)),
+    RewriteRule('ShaderNodeVectorMath', 'MULTIPLY', _identity(1, 0, 1)),
+    RewriteRule('ShaderNodeVectorMath', 'DIVIDE', _identity(0, 1, 1)),
+    RewriteRule('ShaderNodeVectorMath', 'SCALE', _identity(0, 3, 1)),
+    RewriteRule('ShaderNodeVectorMath', 'SCALE', _scale_twice_by_minus_one),
+    RewriteRule('ShaderNodeVectorMath', 'MINIMUM', _same_operands),
+    RewriteRule('ShaderNodeVectorMath', 'MAXIMUM', _same_operands),
+    RewriteRule('ShaderNodeVectorMath', 'ABSOLUTE', _idempotent('ShaderNodeVectorMath', 'ABSOLUTE')),
+    RewriteRule('ShaderNodeVectorMath', 'NORMALIZE', _idempotent('ShaderNodeVectorMath', 'NORMALIZE')),
+]
+
+def is_single_use(output, live):
+    """
+    Returns True if output is linked to a single live input and is the only output of its node linked
+    to a live node (see LiveLinks), so its node can be absorbed by that consumer without being duplicated.
+    """
+    return len(live.links(output)) == 1 and all(o is output or not live.links(o) for o in output.node.used_outputs())
+
+def is_number(operand):
+    return isinstance(operand, (int, float))
+
+def build_node(node_system, node_name, settings, values):
+    """
+    Creates a node with the given settings (a dict of properties) and input values (outputs or
+    constants, None to leave an input unset), bypassing the builders so CSE never shares it.
+    """
+    node = getattr(node_system, node_name)(**settings)
+    for index, value in enumerate(values):
+        if value is not None:
+            node.get_input(index).set_value(value)
+    return node
+
+def _fuse_multiply_add(node, live):
+    for index, other in ((0, 1), (1, 0)):
+        operand = input_operand(node, index)
+        inner = source_node(operand, 'ShaderNodeMath', 'MULTIPLY')
+        if inner is not None and is_single_use(operand, live) and not node_setting(inner, "use_clamp"):
+            values = (input_operand(inner, 0), input_operand(inner, 1), input_operand(node, other))
+            settings = {"operation": 'MULTIPLY_ADD', "use_clamp": node_setting(node, "use_clamp")}
+            return build_node(node.node_system, "Math", settings, values).o0
+    return None
+
+def _constant_factor(node):
+    """
+    Returns (operand, factor, is_uniform) if the VectorMath node multiplies an operand by a constant
+    (SCALE by a number or MULTIPLY by a constant vector), None otherwise.
+    """
+    operation = node_setting(node, "operation")
+    if operation == 'SCALE':
+        scale = input_operand(node, 3)
+        if is_number(scale):
+            return input_operand(node, 0), (scale,) * 3, True
+    elif operation == 'MULTIPLY':
+        for index, other in ((0, 1), (1, 0)):
+            factor = input_operand(node, other)
+            if factor is not None and not isinstance(factor, NodeOutput):
+                return input_operand(node, index), as_vector(factor), False
+    return None
+
+def _fuse_scaling(node, live):
+    outer = _constant_factor(node)
+    if outer is None or not isinstance(outer[0], NodeOutput) or not is_single_use(outer[0], live):
+        return None
+    inner_node = outer[0].node
+    if inner_node.class_name != 'ShaderNodeVectorMath' or outer[0].template.index != 0:
+        return None
+    inner = _constant_factor(inner_node)
+    if inner is None:
+        return None
+
+    factor = tuple(a * b for a, b in zip(inner[1], outer[1]))
+    if inner[2] and outer[2]:
+        return build_node(node.node_system, "VectorMath", {"operation": 'SCALE'}, (inner[0], None, None, factor[0])).o0
+    return build_node(node.node_system, "VectorMath", {"operation": 'MULTIPLY'}, (inner[0], factor)).o0
+
+def _fuse_clamp(outer_operation, inner_operation, constant_bounds):
+    """
+    Returns a rewrite turning outer(inner(x, a), b) into a Clamp node: MINIMUM(MAXIMUM(x, min), max)
+    always is a clamp, MAXIMUM(MINIMUM(x, max), min) only when min <= max (constant_bounds).
+    """
+    def rewrite(node, live):
+        if not hasattr(node.node_system, "Clamp") or node_setting(node, "use_clamp"):
+            return None
+        for index, other in ((0, 1), (1, 0)):
+            operand = input_operand(node, index)
+            inner = source_node(operand, 'ShaderNodeMath', inner_operation)
+            if inner is None or not is_single_use(operand, live) or node_setting(inner, "use_clamp"):
+                continue
+            x, inner_bound, outer_bound = input_operand(inner, 0), input_operand(inner, 1), input_operand(node, other)
+            if outer_operation == 'MINIMUM':
+                low, high = inner_bound, outer_bound
+            else:
+                low, high = outer_bound, inner_bound
+            if constant_bounds and not (is_number(low) and is_number(high) and low <= high):
+                continue
+            return build_node(node.node_system, "Clamp", {"clamp_type": 'MINMAX'}, (x, low, high)).o0
+        return None
+    return rewrite
+
+FUSION_RULES = [
+    RewriteRule('ShaderNodeMath', 'ADD', _fuse_multiply_add, name="multiply_add"),
+    RewriteRule('ShaderNodeMath', 'ADD', _unclamped(_subtract_negation), name="subtract"),
+    RewriteRule('ShaderNodeMath', 'MINIMUM', _fuse_clamp('MINIMUM', 'MAXIMUM', False), name="clamp"),
+    RewriteRule('ShaderNodeMath', 'MAXIMUM', _fuse_clamp('MAXIMUM', 'MINIMUM', True), name="clamp"),
+    RewriteRule('ShaderNodeVectorMath', 'SCALE', _fuse_scaling, name="vector_scale"),
+    RewriteRule('ShaderNodeVectorMath', 'MULTIPLY', _fuse_scaling, name="vector_scale"),
+]
+
+def fuse(nodes):
+    """
+    Lowers node patterns to fewer Blender nodes: a*b+c to MULTIPLY_ADD, -y+x to SUBTRACT, min/max
+    pairs to Clamp and chains of constant vector scalings to a single SCALE or MULTIPLY.
+    Intermediate nodes used by other nodes are left alone so nothing gets duplicated.
+    nodes = a node, a node output or a list of them (the roots of the graph).
+    Returns (number of nodes removed, dict of pattern name -> times applied).
+    """
+    fuser = Simplifier(FUSION_RULES)
+    removed = fuser.simplify(nodes)
+    return removed, fuser.applied
+
+ASSOCIATIVE_OPERATIONS = {
+    'ShaderNodeMath': ('ADD', 'MULTIPLY', 'MINIMUM', 'MAXIMUM'),
+    'ShaderNodeVectorMath': ('ADD', 'MULTIPLY', 'MINIMUM', 'MAXIMUM'),
+}
+
+def _chain_key(node):
+    operation = node_setting(node, "operation")
+    if operation in ASSOCIATIVE_OPERATIONS.get(node.class_name, ()) and not node_setting(node, "use_clamp"):
+        return (node.class_name, operation)
+    return None
+
+def _is_chain_link(output, key, live):
+    return (isinstance(output, NodeOutput) and output.template.index == 0 and is_single_use(output, live)
+        and _chain_key(output.node) == key)
+
+def _chain_leaves(node, key, live):
+    """
+    Returns the operands of the chain of same associative operations ending at node, left to right,
+    and the depth of that chain.
+    """
+    leaves = []
+    depth = 0
+    # in order traversal: the first operand is popped and expanded before the second, level 0 marks a leaf
+    stack = [(node, 1)]
+    while stack:
+        current, level = stack.pop()
+        if level == 0:
+            leaves.append(current)
+            continue
+        depth = max(depth, level)
+        for index in (1, 0):
+            operand = input_operand(current, index)
+            if _is_chain_link(operand, key, live):
+                stack.append((operand.node, level + 1))
+            else:
+                stack.append((operand, 0))
+    return leaves, depth
+
+def rebalance(nodes):
+    """
+    Rebuilds the chains of a same associative operation (ADD, MULTIPLY, MINIMUM, MAXIMUM of unclamped
+    Math and VectorMath nodes) as balanced trees, so a chain of n operands gets a depth of log2(n)
+    instead of n. Operands keep their left to right order. Only nodes feeding a single consumer are
+    part of a chain, shared intermediate values are kept.
+    nodes = a node, a node output or a list of them (the roots of the graph).
+    Returns the number of chains rebuilt.
+    """
+    roots = to_roots(nodes)
+    graph = NodeGraph.from_roots(roots)
+    live = LiveLinks(graph)
+    rebuilt = 0
+    for node in graph.nodes:
+        key = _chain_key(node)
+        if key is None or not live.is_live(node):
+            continue
+        output = node.get_output(0)
+        links = live.links(output)
+        if not links or is_single_use(output, live) and _chain_key(links[0].input.node) == key and links[0].input.template.index < 2:
+            continue
+
+        leaves, depth = _chain_leaves(node, key, live)
+        if depth <= (len(leaves) - 1).bit_length():
+            continue
+
+        node_name = "Math" if key[0] == 'ShaderNodeMath' else "VectorMath"
+        while len(leaves) > 1:
+            leaves = [build_node(node.node_system, node_name, {"operation": key[1]}, (leaves[i], leaves[i + 1])).o0
+                if i + 1 < len(leaves) else leaves[i] for i in range(0, len(leaves), 2)]
+        live.add(leaves[0].node)
+        for link in links:
+            link.input.set_value(leaves[0])
+        live.release(node)
+        rebuilt += 1
+
+    return rebuilt
+
+def _cone_content(node):
+    props = tuple((k, frozen_value(node.__dict__.get(k, v))) for k, v in sorted(node.own_props.items()))
+    values = tuple((i.template.index, frozen_value(i.value)) for i in sorted(node.used_inputs(), key=lambda i: i.template.index)
+        if not i.link and i.value is not None and frozen_value(i.value) != frozen_value(i.template.default_value))
+    outputs = tuple((o.template.index, frozen_value(o.value))
+        for o in sorted(node.used_outputs(), key=lambda o: o.template.index) if o.value is not None)
+    return (node.class_name, getattr(node, "group", None), props, values, outputs)
+
+def linked_outputs(node, live):
+    return [o for o in sorted(node.used_outputs(), key=lambda o: o.template.index) if live.links(o)]
+
+def cone_signature(root, members, live):
+    """
+    Returns the signature of the cone of nodes ending at root (members being the set of its nodes) and
+    its parameters: the outputs outside the cone linked to it, in order of first use. Only the outputs
+    of the root linked to live nodes (see LiveLinks) are part of the signature. Two cones with the
+    same signature compute the same outputs from their parameters. The nodes are numbered breadth first
+    from the root, following the inputs in order, so the signature does not depend on creation order.
+    """
+    order = [root]
+    numbers = {root: 0}
+    params = {}
+    entries = []
+    head = 0
+    while head < len(order):
+        node = order[head]
+        head += 1
+        links = []
+        for input in sorted(node.used_inputs(), key=lambda i: i.template.index):
+            if not input.link:
+                continue
+            output = input.link.output
+            if output.node in members:
+                if output.node not in numbers:
+                    numbers[output.node] = len(order)
+                    order.append(output.node)
+                links.append((input.template.index, output.template.index, numbers[output.node]))
+            else:
+                if output not in params:
+                    params[output] = len(params)
+                links.append((input.template.index, -1, params[output]))
+        entries.append((_cone_content(node), tuple(links)))
+
+    params = list(params)
+    used = tuple(o.template.index for o in linked_outputs(root, live))
+    return (tuple(entries), used, tuple(p.template.type for p in params)), params
+
+def repeated_cones(nodes, min_size = 4):
+    """
+    Finds the subgraphs repeated in the graph of the given nodes. A cone is a node and the nodes whose
+    outputs are only used by it (recursively), so it can be replaced by a node group without duplicating
+    anything. The cones of at least min_size nodes are first bucketed by a hash of their content and
+    then compared exactly with cone_signature.
+    nodes = a node, a node output or a list of them (the roots of the graph, eg the output nodes of
+    several materials, never part of a cone).
+    Returns a list of lists of (root node, set of nodes) with the same signature, at least two per list,
+    the ones saving the most nodes first. A node belongs to a single cone of the result.
+    """
+    roots = to_roots(nodes)
+    graph = NodeGraph.from_roots(roots)
+    root_ids = set(graph.node_ids[as_node(r)] for r in roots)
+    live = LiveLinks(graph)
+    count = len(graph)
+
+    # owner[i] = the node absorbing node i in its cone: the only node using its outputs
+    owner = [-1] * count
+    for i in range(count):
+        if i in root_ids or not is_mergeable(graph.nodes[i]):
+            continue
+        targets = set(graph.edge_target[e] for e in graph.output_edges(i))
+        if len(targets) == 1:
+            target = targets.pop()
+            if is_mergeable(graph.nodes[target]):
+                owner[i] = target
+
+    children = [[] for _ in range(count)]
+    for i in range(count):
+        if owner[i] >= 0:
+            children[owner[i]].append(i)
+
+    sizes = [1] * count
+    hashes = [0] * count
+    for i in graph.topological_order():
+        links = []
+        for e in graph.input_edges(i):
+            source = graph.edge_source[e]
+            links.append((graph.edge_input[e], graph.edge_output[e], hashes[source] if owner[source] == i else 0))
+        hashes[i] = hash((_cone_content(graph.nodes[i]), tuple(sorted(links))))
+        sizes[i] += sum(sizes[c] for c in children[i])
+
+    buckets = defaultdict(list)
+    for i in range(count):
+        if sizes[i] >= min_size and i not in root_ids and graph.output_edges(i) and is_mergeable(graph.nodes[i]):
+            buckets[hashes[i]].append(i)
+
+    classes = defaultdict(list)
+    for candidates in buckets.values():
+        if len(candidates) < 2:
+            continue
+        for i in candidates:
+            members = set()
+            stack = [i]
+            while stack:
+                j = stack.pop()
+                members.add(graph.nodes[j])
+                stack.extend(children[j])
+            signature, _ = cone_signature(graph.nodes[i], members, live)
+            classes[signature].append((sizes[i], graph.nodes[i], members))
+
+    result = []
+    taken = set()
+    for cones in sorted(classes.values(), key=lambda cones: (cones[0][0] - 1) * (len(cones) - 1), reverse=True):
+        cones = [(root, members) for size, root, members in cones if taken.isdisjoint(members)]
+        if len(cones) < 2:
+            continue
+        for root, members in cones:
+            taken.update(members)
+        result.append(cones)
+    return result
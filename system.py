@@ -1,32 +1,34 @@
 import bpy
-import inspect
 
 from nodes_for_python.nodes import *
 from nodes_for_python.utils import *
+from nodes_for_python.catalog import load_catalog
+from nodes_for_python.graph import NodeGraph
+from nodes_for_python.optimizer import builder_key, matches_builder_key
 
 def get_node_input_templates(node):
+    return make_input_templates(get_socket_specs(node.inputs))
+
+def get_node_output_templates(node):
+    return make_output_templates(get_socket_specs(node.outputs))
+
+def make_input_templates(specs):
     result = []
-    for index, node_input in enumerate(node.inputs):
-        identifier = node_input.name
+    for index, (identifier, input_type, default_value) in enumerate(specs):
         name = python_name(identifier)
-        input_type = node_input.type
-        default_value = node_input.default_value if hasattr(node_input, "default_value") else None
         template = NodeInputTemplate(index, name, identifier, input_type, default_value)
         result.append(template)
-        
+
     unique_names(result)
     return result
 
-def get_node_output_templates(node):
+def make_output_templates(specs):
     result = []
-    for index, node_output in enumerate(node.outputs):
-        identifier = node_output.name
+    for index, (identifier, output_type, default_value) in enumerate(specs):
         name = python_name(identifier)
-        output_type = node_output.type
-        default_value = node_output.default_value if hasattr(node_output, "default_value") else None            
         template = NodeOutputTemplate(index, name, identifier, output_type, default_value)
         result.append(template)
-        
+
     unique_names(result)
     return result
 
@@ -44,6 +46,8 @@ class GroupNode(BaseNode):
 
         self.input_templates = get_node_input_templates(group)
         self.output_templates = get_node_output_templates(group)
+        self.input_index = make_input_index(self.input_templates)
+        self.output_index = make_output_index(self.output_templates)
         self.node_system = node_system
         self.class_name = "ShaderNodeGroup"
         self.own_props = dict()
@@ -57,8 +61,7 @@ class GroupInputNode(BaseNode):
         self.own_props = dict()
         self.input_templates = []
         self.output_templates = []
-        self.inputs = []
-        self.outputs = []
+        self.output_index = {}
         self.node_system = node_system
         
         BaseNode.__init__(self)
@@ -73,15 +76,14 @@ class GroupInputNode(BaseNode):
         min_value = the minimum value for this socket
         max_value = the maximum value for this socket
         """
-        index = len(self.outputs)
+        index = len(self.output_templates)
         name = python_name(identifier)
         template = NodeOutputTemplate(index, name, identifier, type, default_value)
         template.min_value = min_value
         template.max_value = max_value
-        output = NodeOutput(self, template)
-        self.outputs.append(output)
-        self.__dict__[template.o_name] = output
-        self.__dict__[template.name] = output
+        self.output_templates.append(template)
+        self.output_index[template.o_name] = index
+        self.output_index[template.name] = index
 
 class GroupOutputNode(BaseNode):
     def __init__(self, node_system):
@@ -90,8 +92,7 @@ class GroupOutputNode(BaseNode):
         self.own_props = dict()
         self.input_templates = []
         self.output_templates = []
-        self.inputs = []
-        self.outputs = []
+        self.input_index = {}
         self.node_system = node_system
 
         BaseNode.__init__(self)
@@ -106,14 +107,14 @@ class GroupOutputNode(BaseNode):
         min_value = the minimum value for this socket
         max_value = the maximum value for this socket
         """
-        index = len(self.inputs)
+        index = len(self.input_templates)
         name = python_name(identifier)
         template = NodeInputTemplate(index, name, identifier, type, default_value)
         template.min_value = min_value
         template.max_value = max_value
-        input = NodeInput(self, template)
-        self.inputs.append(input)
-        self.__dict__[template.i_name] = input
+        self.input_templates.append(template)
+        self.input_index[template.i_name] = index
+        self.input_index[template.name] = index
 
 class FrameNode(BaseNode):
     def __init__(self, node_system):
@@ -122,8 +123,6 @@ class FrameNode(BaseNode):
         self.own_props = dict()
         self.input_templates = []
         self.output_templates = []
-        self.inputs = []
-        self.outputs = []
         self.node_system = node_system
         self.text = ""
 
@@ -131,48 +130,61 @@ class FrameNode(BaseNode):
 
 class NodeSystem:
 
-    def __init__(self):
-        self.__initialize()
-            
-    def __initialize(self):
-        shader_names = get_shader_names()
-
-        sample_tree = bpy.data.node_groups.new("samples", 'ShaderNodeTree')
-        sample_nodes = sample_tree.nodes
-        for name in sorted(shader_names):
-            try:
-                if name == "ShaderNodeGroup":
-                    pass
-                else:
-                    sample_nodes.new(name)
-            except:
-                pass
-
-        fresnel = sample_nodes['Fresnel']
-        fresnel_props = get_properties(fresnel)
-        
-        for node in sample_nodes:
-            node_class = self.__initialize_node(fresnel_props, node)
+    __entries = {}
+
+    def __init__(self, catalog_path = None, cse = False):
+        """
+        catalog_path = location of the node catalog cache file, None for the default one in Blender's config folder.
+        The catalog is only rebuilt from sample nodes when the Blender version or the enabled add-ons change.
+        Node classes (NodeSystem.Math, NodeSystem.BsdfPrincipled...) are created on first access.
+        cse = when True, math, vector_math and combine builders (and the operators using them) return the
+        existing node when an identical one was already built. Such shared nodes must not be modified afterwards.
+        """
+        self.cse = cse
+        self.__cse_nodes = {}
+        self.__parameters = None
+        self.__initialize(catalog_path)
             
-        bpy.data.node_groups.remove(sample_tree)
-        
-    def __initialize_node(self, base_props, node):
-        own_props = get_own_properties(base_props, node)
+    def __initialize(self, catalog_path):
+        self.__entries = {}
+        for entry in load_catalog(catalog_path):
+            name = entry["class_name"].replace("ShaderNode", "", 1)
+            self.__entries[name] = entry
+
+    def __getattr__(self, name):
+        entry = self.__entries.get(name)
+        if entry is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return self.__initialize_node(name, entry)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self.__entries))
+
+    def __initialize_node(self, name, entry):
+        property_infos = {name: PropertyInfo(name, type, default, enum_items)
+            for name, type, default, enum_items in entry["properties"]}
+        own_props = {name: info.default for name, info in property_infos.items()}
         if "label" not in own_props: own_props["label"] = None
 
-        class_name = node.__class__.__name__
-        name = class_name.replace("ShaderNode", "", 1)
+        class_name = entry["class_name"]
+        input_templates = make_input_templates(entry["inputs"])
+        output_templates = make_output_templates(entry["outputs"])
+        output_index = make_output_index(output_templates)
 
-        props = {}
-        for k, v in own_props.items(): props[k] = v
+        # outputs keep precedence over properties of the same name (eg TexCoord.object)
+        props = {k: v for k, v in own_props.items() if k not in output_index}
 
         node_class = type(name, (BaseNode, ), props)
         setattr(self, name, node_class)
 
         node_class.class_name = class_name
         node_class.own_props = own_props
-        node_class.input_templates = get_node_input_templates(node)
-        node_class.output_templates = get_node_output_templates(node)
+        node_class.property_infos = property_infos
+        node_class.input_templates = input_templates
+        node_class.output_templates = output_templates
+        node_class.input_index = make_input_index(input_templates)
+        node_class.output_index = output_index
+        node_class.layout_size = (entry["width"], entry["height"])
         node_class.node_system = self
         
         def __init__(self, **kwargs):
@@ -192,7 +204,11 @@ class NodeSystem:
         params = ", ".join(keys)
         doc = f"NodeSystem.{node_class.__name__}({params})\n"
         for k in keys:
-            doc += f"    {k} = default value {node_class.own_props[k]}\n"
+            doc += f"    {k} = default value {node_class.own_props[k]}"
+            info = node_class.property_infos.get(k)
+            if info and info.enum_items:
+                doc += f" (one of {', '.join(info.enum_items)})"
+            doc += "\n"
         node_class.__doc__ = f"""{doc}"""
 
     def Group(self, group):
@@ -213,6 +229,22 @@ class NodeSystem:
         """
         return GroupOutputNode(self)
 
+    def parameter(self, name, type = 'VALUE', default_value = None, min_value = None, max_value = None):
+        """
+        Returns the parameter placeholder of the given name, creating it on first call: an output of the
+        group input node shared by all the parameters of this node system. A graph using parameters is
+        generated as a node group with one input per parameter (see NodeGenerator.generate_variants).
+        type = socket type of the parameter ('VALUE', 'RGBA', 'VECTOR'...).
+        default_value = the default value of the parameter, used by the variants that do not set it.
+        """
+        if self.__parameters is None:
+            self.__parameters = GroupInputNode(self)
+        for template in self.__parameters.output_templates:
+            if template.identifier == name:
+                return self.__parameters.get_output(template.index)
+        self.__parameters.add_output(name, type, default_value, min_value, max_value)
+        return self.__parameters.get_output(len(self.__parameters.output_templates) - 1)
+
     def vector_math(self, operation, v1, v2 = None, v3 = None, v4 = None):
         """
         Creates and returns a VectorMath node.
@@ -222,6 +254,11 @@ class NodeSystem:
         v3 = value for the third input (either a tuple(3) or a node or a node output).
         v4 = value for the fourth input (either a tuple(3) or a node or a node output).
         """
+        key = self.__cse_key("VectorMath", operation, (v1, v2, v3, v4))
+        shared = self.__cse_shared(key)
+        if shared is not None:
+            return shared
+
         result = self.VectorMath()
         result.operation = operation
         result.i0 = as_output(v1)
@@ -231,7 +268,7 @@ class NodeSystem:
             result.i2 = as_output(v3)
         if v4 is not None:
             result.i3 = as_output(v4)
-        return result
+        return self.__cse_share(key, result)
 
     def vector_add(self, v1, v2):
         """
@@ -390,18 +427,25 @@ class NodeSystem:
 
     def vector_sum(self, vs):
         """
-        Creates a node tree part that is the sum of the given entries.
+        Creates a node tree part that is the sum of the given entries, as a balanced tree of additions.
         vs = a tuple or array of nodes or node outputs.
         """
+        return self.__balanced(self.vector_add, vs)
+
+    def vector_product(self, vs):
+        """
+        Creates a node tree part that is the component-wise product of the given entries, as a balanced tree.
+        vs = a tuple or array of nodes or node outputs.
+        """
+        return self.__balanced(self.vector_multiply, vs)
+
+    def __balanced(self, combine, vs):
+        vs = list(vs)
         if len(vs) == 0:
             return None
-        elif len(vs) == 1:
-            return vs[0]
-        else:
-            a = self.vector_add(vs[0], vs[1])
-            for v in vs[2:]:
-                a = self.vector_add(a,v)
-            return a
+        while len(vs) > 1:
+            vs = [combine(vs[i], vs[i + 1]) if i + 1 < len(vs) else vs[i] for i in range(0, len(vs), 2)]
+        return vs[0]
 
     def math(self, operation, v1, v2 = None, v3 = None):
         """
@@ -411,6 +455,11 @@ class NodeSystem:
         v2 = value for the second input (either a value or a node or a node output).
         v3 = value for the third input (either a value or a node or a node output).
         """
+        key = self.__cse_key("Math", operation, (v1, v2, v3))
+        shared = self.__cse_shared(key)
+        if shared is not None:
+            return shared
+
         result = self.Math()
         result.operation = operation
         result.i0 = as_output(v1)
@@ -418,7 +467,21 @@ class NodeSystem:
             result.i1 = as_output(v2)
         if v3 is not None:
             result.i2 = as_output(v3)
-        return result
+        return self.__cse_share(key, result)
+
+    def math_sum(self, vs):
+        """
+        Creates a node tree part that is the sum of the given entries, as a balanced tree of additions.
+        vs = a tuple or array of values, nodes or node outputs.
+        """
+        return self.__balanced(self.math_add, vs)
+
+    def math_product(self, vs):
+        """
+        Creates a node tree part that is the product of the given entries, as a balanced tree of multiplications.
+        vs = a tuple or array of values, nodes or node outputs.
+        """
+        return self.__balanced(self.math_multiply, vs)
 
     def math_add(self, v1, v2):
         """
@@ -452,7 +515,7 @@ class NodeSystem:
         """
         Creates a Math node and returns the corresponding output slot.
         """
-        return self.math('MUTIPLY_ADD', v1, v2, v3).outputs[0]
+        return self.math('MULTIPLY_ADD', v1, v2, v3).outputs[0]
 
     def math_power(self, v1, v2):
         """
@@ -670,34 +733,54 @@ class NodeSystem:
         """
         return self.math('DEGREES', v).outputs[0]
 
-    def __combine(self, comb, abc):
+    def __cse_key(self, node_name, settings, values):
+        return builder_key(node_name, settings, values) if self.cse else None
+
+    def __cse_shared(self, key):
+        # an entry whose node was relinked since (eg by an optimizer pass) no longer computes its key
+        node = self.__cse_nodes.get(key)
+        if node is not None and not matches_builder_key(node, key):
+            del self.__cse_nodes[key]
+            node = None
+        return node
+
+    def __cse_share(self, key, node):
+        if key is not None:
+            self.__cse_nodes[key] = node
+        return node
+
+    def __combine(self, node_name, abc):
         if is_numeric(abc) or isinstance(abc, BaseNode) or isinstance(abc, NodeOutput):
-            comb.i0 = abc
-            comb.i1 = abc
-            comb.i2 = abc
-        else :
-            comb.i0 = abc[0]
-            comb.i1 = abc[1]
-            comb.i2 = abc[2]
-        return comb
+            abc = (abc, abc, abc)
+
+        key = self.__cse_key(node_name, None, abc[:3])
+        shared = self.__cse_shared(key)
+        if shared is not None:
+            return shared
+
+        comb = getattr(self, node_name)()
+        comb.i0 = abc[0]
+        comb.i1 = abc[1]
+        comb.i2 = abc[2]
+        return self.__cse_share(key, comb)
     
     def combine_xyz(self, xyz):
         """
         Creates and returns a CombineXYZ node.
         """
-        return self.__combine(self.CombineXYZ(), xyz)
+        return self.__combine("CombineXYZ", xyz)
 
     def combine_hsv(self, hsv):
         """
         Creates and returns a CombineHSV node.
         """
-        return self.__combine(self.CombineHSV(), hsv)
+        return self.__combine("CombineHSV", hsv)
 
     def combine_rgb(self, rgb):
         """
         Creates and returns a CombineRGB node.
         """
-        return self.__combine(self.CombineRGB(), rgb)
+        return self.__combine("CombineRGB", rgb)
 
     def value(self, v):
         """
@@ -721,5 +804,5 @@ class NodeSystem:
         return frame
 
     def frame_all(self, name, text, nodes):
-        return self.frame(name, text, get_all_ancestors(as_node(n) for n in nodes))
+        return self.frame(name, text, NodeGraph.from_roots(nodes).nodes)
 
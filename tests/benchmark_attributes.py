@@ -0,0 +1,21 @@
+"""
+Microbenchmark of attribute assignment on a wide node (BsdfPrincipled and its 26 inputs): a socket
+set by name, by iN alias, and an attribute that is not a socket.
+Run with python tests/benchmark_attributes.py, outside Blender it uses the bpy stand-in.
+"""
+import timeit
+
+import conftest
+from nodes_for_python import NodeSystem
+
+def main(count = 100000):
+    ns = NodeSystem()
+    node = ns.BsdfPrincipled()
+    last = node.input_templates[-1]
+    cases = [("last input by name", last.name), ("last input by alias", last.i_name), ("not a socket (label)", "label")]
+    for label, name in cases:
+        seconds = timeit.timeit(lambda: setattr(node, name, 0.5), number = count)
+        print(f"{label}: {seconds / count * 1e9:.0f} ns per assignment")
+
+if __name__ == "__main__":
+    main()
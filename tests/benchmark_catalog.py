@@ -0,0 +1,31 @@
+"""
+Benchmark of NodeSystem startup with an empty catalog cache (cold: the catalog is extracted from sample
+nodes and written) and with the cache file of a previous run (warm: the catalog is read from it).
+Run with python tests/benchmark_catalog.py, outside Blender it uses the bpy stand-in, which only has a
+few node classes: the cold numbers are meaningful inside Blender only.
+"""
+import os
+import tempfile
+import time
+
+import conftest
+from nodes_for_python import NodeSystem
+from nodes_for_python.catalog import load_catalog
+
+def startup(path, cold):
+    if cold and os.path.exists(path):
+        os.remove(path)
+    start = time.perf_counter()
+    NodeSystem(catalog_path = path)
+    return time.perf_counter() - start
+
+def main(count = 20):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.json")
+        print(f"{len(load_catalog(path))} node classes")
+        for label, cold in (("cold (empty cache)", True), ("warm (cached catalog)", False)):
+            seconds = min(startup(path, cold) for _ in range(count))
+            print(f"{label}: {seconds * 1e3:.2f} ms per NodeSystem()")
+
+if __name__ == "__main__":
+    main()
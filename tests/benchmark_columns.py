@@ -0,0 +1,65 @@
+"""
+Benchmark of the column assignment of NodeLayout on generated trees of 10^3 to 2 * 10^4 nodes: the
+single longest-path pass (links read once from RNA) next to the fixed-point loop it replaced, which
+sweeps the nodes reading the links of their outputs until no column changes. The loop is timed over
+the nodes in tree order and, up to 2000 nodes, in reverse order, with the number of sweeps it needed.
+Run with python tests/benchmark_columns.py, outside Blender it uses the bpy stand-in.
+"""
+import random
+import time
+
+import conftest
+from nodes_for_python import NodeSystem, NodeGenerator
+from nodes_for_python.layout import _links, _longest_path_columns
+
+def build(ns, count):
+    # each Math node adds the previous output and one of the 64 previous ones, the last one is the root
+    rng = random.Random(count)
+    outputs = [ns.Value().o0 for _ in range(64)]
+    for _ in range(count - 64):
+        outputs.append(ns.math_add(outputs[-1], outputs[-rng.randint(1, 64)]))
+    return outputs[-1]
+
+def fixed_point_columns(nodes):
+    # the loop used before the longest-path pass, it puts the sinks in column -1 instead of 0
+    cols = {n: 0 for n in nodes}
+    sweeps = 0
+    all_placed = False
+    while not all_placed:
+        all_placed = True
+        sweeps += 1
+        for n in nodes:
+            col_min = min((cols[l.to_node] for o in n.outputs for l in o.links), default=0)
+            if cols[n] >= col_min:
+                cols[n] = col_min - 1
+                all_placed = False
+    return cols, sweeps
+
+def longest_path_columns(nodes):
+    ids = {n: i for i, n in enumerate(nodes)}
+    cols = _longest_path_columns(len(nodes), _links(nodes, ids))
+    return {n: cols[i] for i, n in enumerate(nodes)}
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def main(reversed_limit = 2000):
+    generator = NodeGenerator()
+    for count in (1000, 5000, 10000, 20000):
+        material = generator.generate(build(NodeSystem(), count), f"columns {count}")
+        nodes = list(material.node_tree.nodes)
+        print(f"{len(nodes)} nodes")
+        cols, seconds = timed(lambda: longest_path_columns(nodes))
+        print(f"  longest path: {seconds:.3f} s")
+        (fixed, sweeps), seconds = timed(lambda: fixed_point_columns(nodes))
+        assert all(fixed[n] == col - 1 for n, col in cols.items())
+        print(f"  fixed point, tree order: {seconds:.3f} s ({sweeps} sweeps)")
+        if count <= reversed_limit:
+            (fixed, sweeps), seconds = timed(lambda: fixed_point_columns(nodes[::-1]))
+            assert all(fixed[n] == col - 1 for n, col in cols.items())
+            print(f"  fixed point, reverse order: {seconds:.3f} s ({sweeps} sweeps)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of NodeGraph at 10^4 and 10^5 nodes: time and memory of the authoring objects (BaseNode,
+sockets, links), of the NodeGraph snapshot and of its traversals, next to the level by level set
+traversal the generator used before NodeGraph.
+Run with python tests/benchmark_graph.py, outside Blender it uses the bpy stand-in.
+"""
+import random
+import time
+import tracemalloc
+
+import conftest
+from nodes_for_python import NodeSystem
+from nodes_for_python.nodes import as_node
+from nodes_for_python.graph import NodeGraph
+
+def build(ns, count):
+    # each Math node adds two of the 64 previous outputs, the last one is the root
+    rng = random.Random(count)
+    outputs = [ns.Value().o0 for _ in range(64)]
+    for _ in range(count - 64):
+        outputs.append(ns.math_add(outputs[-rng.randint(1, 64)], outputs[-rng.randint(1, 64)]))
+    return outputs[-1]
+
+def level_sets(root):
+    nodes = set((as_node(root),))
+    parents = set(nodes)
+    while parents:
+        parents = set(a for p in parents for a in p.get_input_nodes() if a not in nodes)
+        nodes.update(parents)
+    return nodes
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def allocated(function):
+    # measured apart from the time, tracemalloc slows allocations down; the result is kept until measured
+    tracemalloc.start()
+    result = function()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory
+
+def main():
+    ns = NodeSystem()
+    for count in (10 ** 4, 10 ** 5):
+        root, seconds = timed(lambda: build(ns, count))
+        memory = allocated(lambda: build(ns, count))
+        print(f"{count} nodes")
+        print(f"  authoring objects: {seconds:.2f} s, {memory / count:.0f} bytes per node")
+        graph, seconds = timed(lambda: NodeGraph.from_roots([root]))
+        memory = allocated(lambda: NodeGraph.from_roots([root]))
+        print(f"  NodeGraph.from_roots: {seconds:.3f} s, {memory / count:.0f} bytes per node")
+        print(f"  topological_order: {timed(graph.topological_order)[1]:.3f} s")
+        print(f"  ancestors: {timed(lambda: graph.ancestors([len(graph) - 1]))[1]:.3f} s")
+        print(f"  level by level sets (before NodeGraph): {timed(lambda: level_sets(root))[1]:.3f} s")
+
+if __name__ == "__main__":
+    main()
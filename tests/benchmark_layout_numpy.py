@@ -0,0 +1,51 @@
+"""
+Benchmark of the NumPy paths of the layered layout (stacked tops, column xs and the location array)
+next to the pure Python ones, on random graphs of 4 * 10^3 and 2 * 10^4 nodes: the two functions on
+their own and the whole layout. Run with python tests/benchmark_layout_numpy.py, NumPy must be installed.
+"""
+import random
+import time
+
+import numpy
+
+import conftest
+import nodes_for_python.layout as layout
+
+def random_graph(count):
+    # each node feeds one of the 64 next ones, the last one is the only sink
+    rng = random.Random(count)
+    links = [(i, min(count - 1, i + rng.randint(1, 64)), 0) for i in range(count - 1)]
+    widths = [rng.choice((140.0, 150.0, 240.0)) for _ in range(count)]
+    sizes = [rng.choice((100.0, 150.0, 300.0)) for _ in range(count)]
+    return widths, sizes, links
+
+def best(function, repeat = 5):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+def measure(widths, sizes, links):
+    count = len(widths)
+    graph = layout._LayeredGraph(count, layout._longest_path_columns(count, links), links)
+    all_sizes = list(sizes) + [layout.DUMMY_SIZE] * (len(graph.layer_of) - count)
+    return (best(lambda: layout._stacked_tops(graph, all_sizes)), best(lambda: layout._column_xs(graph, widths)),
+        best(lambda: layout._layered_layout(widths, sizes, links, 60.0), 3))
+
+def main():
+    for count in (4000, 20000):
+        widths, sizes, links = random_graph(count)
+        with_numpy = measure(widths, sizes, links)
+        layout.numpy = None
+        try:
+            without_numpy = measure(widths, sizes, links)
+        finally:
+            layout.numpy = numpy
+        print(f"{count} nodes")
+        for label, a, b in zip(("stacked tops", "column xs", "whole layout"), without_numpy, with_numpy):
+            print(f"  {label}: {a * 1e3:.1f} ms pure Python, {b * 1e3:.1f} ms NumPy")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark of the memory taken by 10^4 linked VectorMath nodes with the socket and link classes using
+__slots__, next to the same classes rebuilt without __slots__ (a __dict__ per instance).
+Run with python tests/benchmark_sockets.py, outside Blender it uses the bpy stand-in.
+"""
+import tracemalloc
+import types
+
+import conftest
+import nodes_for_python.nodes as nodes
+from nodes_for_python import NodeSystem
+
+SLOTTED = ("NodeLink", "NodeInput", "NodeOutput")
+
+def without_slots(cls, copies):
+    # same methods and bases, but the instances get a __dict__
+    if "__slots__" not in vars(cls):
+        return cls
+    if cls not in copies:
+        namespace = {k: v for k, v in vars(cls).items() if k not in cls.__slots__ and k not in ("__slots__", "__dict__", "__weakref__")}
+        copy = type(cls.__name__, tuple(without_slots(b, copies) for b in cls.__bases__), namespace)
+        for name, function in namespace.items():
+            # super() finds the class in a closure cell, which must be the copy
+            if isinstance(function, types.FunctionType) and "__class__" in function.__code__.co_freevars:
+                cells = tuple(types.CellType(copy) if var == "__class__" else cell
+                    for var, cell in zip(function.__code__.co_freevars, function.__closure__))
+                setattr(copy, name, types.FunctionType(function.__code__, function.__globals__, name, function.__defaults__, cells))
+        copies[cls] = copy
+    return copies[cls]
+
+def build(ns, count):
+    coordinates = ns.TexCoord()
+    vector = coordinates.o0
+    for _ in range(count):
+        vector = ns.vector_math('ADD', vector, coordinates.o2).outputs[0]
+    return vector
+
+def allocated(ns, count):
+    # the result is kept until measured
+    tracemalloc.start()
+    root = build(ns, count)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory
+
+def main(count = 10 ** 4):
+    ns = NodeSystem()
+    build(ns, 10)
+    slotted = allocated(ns, count)
+
+    originals = {name: getattr(nodes, name) for name in SLOTTED}
+    copies = {}
+    for name, cls in originals.items():
+        setattr(nodes, name, without_slots(cls, copies))
+    try:
+        unslotted = allocated(ns, count)
+    finally:
+        for name, cls in originals.items():
+            setattr(nodes, name, cls)
+
+    print(f"{count} VectorMath nodes")
+    print(f"  without __slots__: {unslotted / count:.0f} bytes per node")
+    print(f"  with __slots__: {slotted / count:.0f} bytes per node")
+
+if __name__ == "__main__":
+    main()
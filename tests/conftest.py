@@ -0,0 +1,20 @@
+import os
+import sys
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# outside Blender, bpy and mathutils come from the stand-in
+try:
+    import bpy
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, "stand_in"))
+
+# the repository is the nodes_for_python package itself
+if "nodes_for_python" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("nodes_for_python", os.path.join(ROOT, "__init__.py"),
+        submodule_search_locations = [ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["nodes_for_python"] = module
+    spec.loader.exec_module(module)
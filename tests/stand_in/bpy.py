@@ -0,0 +1,323 @@
+"""
+Minimal stand-in for the parts of the Blender API used by nodes_for_python, so the tests run
+outside Blender. Only a few shader node classes exist and node trees are not evaluated.
+"""
+import os
+import tempfile
+import types as _types
+
+from mathutils import Vector
+
+class bpy_struct:
+    pass
+
+class bpy_prop_collection(list):
+    pass
+
+class Property:
+    def __init__(self, identifier, type, default = None, enum_items = (), readonly = False):
+        self.identifier = identifier
+        self.type = type
+        self.default = default
+        self.is_readonly = readonly
+        self.is_enum_flag = False
+        self.is_array = isinstance(default, tuple)
+        self.default_array = default if self.is_array else ()
+        self.enum_items = [_types.SimpleNamespace(identifier = item) for item in enum_items]
+
+class RNA:
+    def __init__(self, properties):
+        self.properties = properties
+
+class Socket(bpy_struct):
+    def __init__(self, node, name, type, default_value, is_output):
+        self.node = node
+        self.name = name
+        self.identifier = name
+        self.type = type
+        self.is_output = is_output
+        self.links = []
+        if default_value is not None:
+            self.default_value = default_value
+
+class Node(bpy_struct):
+    bl_rna = RNA([Property('name', 'STRING', ''), Property('label', 'STRING', ''),
+        Property('location', 'FLOAT', (0.0, 0.0)), Property('width', 'FLOAT', 140.0),
+        Property('height', 'FLOAT', 100.0), Property('hide', 'BOOLEAN', False), Property('parent', 'POINTER')])
+    INPUTS = []
+    OUTPUTS = []
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.name = type(self).__name__.replace("ShaderNode", "", 1)
+        self.label = ""
+        self.location = Vector((0.0, 0.0))
+        self.width = 140.0
+        self.height = 100.0
+        self.hide = False
+        self.parent = None
+        if self.INPUTS is not None:
+            self.inputs = [Socket(self, name, type, default, False) for name, type, default in self.INPUTS]
+            self.outputs = [Socket(self, name, type, default, True) for name, type, default in self.OUTPUTS]
+        self.__properties = {}
+        for prop in self.bl_rna.properties:
+            if not hasattr(self, prop.identifier):
+                setattr(self, prop.identifier, prop.default)
+
+    @property
+    def bl_idname(self):
+        return type(self).__name__
+
+    def __getitem__(self, key):
+        return self.__properties[key]
+
+    def __setitem__(self, key, value):
+        self.__properties[key] = value
+
+    def get(self, key, default = None):
+        return self.__properties.get(key, default)
+
+class ShaderNode(Node):
+    pass
+
+# interface socket class -> socket type, default value
+INTERFACE_SOCKETS = {'NodeSocketFloat': ('VALUE', 0.0), 'NodeSocketInt': ('INT', 0), 'NodeSocketBool': ('BOOLEAN', False),
+    'NodeSocketVector': ('VECTOR', (0.0, 0.0, 0.0)), 'NodeSocketColor': ('RGBA', (0.0, 0.0, 0.0, 1.0)),
+    'NodeSocketString': ('STRING', ''), 'NodeSocketShader': ('SHADER', None)}
+
+class InterfaceSocket(bpy_struct):
+    def __init__(self, socket_type, name):
+        self.name = name
+        self.identifier = name
+        self.type, default_value = INTERFACE_SOCKETS[socket_type]
+        if default_value is not None:
+            self.default_value = default_value
+            self.min_value = None
+            self.max_value = None
+
+class Interface(bpy_prop_collection):
+    def new(self, type, name):
+        socket = InterfaceSocket(type, name)
+        self.append(socket)
+        return socket
+
+class _InterfaceNode:
+    # the sockets of group nodes follow the interface of a node tree, created when first seen
+    def _sockets(self, interface, is_output):
+        sockets = self.__dict__.setdefault("_interface_sockets", {})
+        result = []
+        for item in interface:
+            if (item, is_output) not in sockets:
+                sockets[item, is_output] = Socket(self, item.name, item.type, getattr(item, "default_value", None), is_output)
+            result.append(sockets[item, is_output])
+        return result
+
+class NodeGroupInput(_InterfaceNode, Node):
+    INPUTS = None
+
+    @property
+    def inputs(self):
+        return []
+
+    @property
+    def outputs(self):
+        return self._sockets(self.tree.inputs, True)
+
+class NodeGroupOutput(_InterfaceNode, Node):
+    INPUTS = None
+
+    @property
+    def inputs(self):
+        return self._sockets(self.tree.outputs, False)
+
+    @property
+    def outputs(self):
+        return []
+
+class ShaderNodeGroup(_InterfaceNode, ShaderNode):
+    bl_rna = RNA(Node.bl_rna.properties + [Property('node_tree', 'POINTER')])
+    INPUTS = None
+
+    @property
+    def inputs(self):
+        return self._sockets(self.node_tree.inputs, False) if self.node_tree else []
+
+    @property
+    def outputs(self):
+        return self._sockets(self.node_tree.outputs, True) if self.node_tree else []
+
+def _shader_node(name, inputs, outputs, properties = ()):
+    rna = RNA(Node.bl_rna.properties + list(properties))
+    return type(name, (ShaderNode,), {"INPUTS": inputs, "OUTPUTS": outputs, "bl_rna": rna})
+
+MATH_OPERATIONS = ['ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'MULTIPLY_ADD', 'POWER', 'MINIMUM', 'MAXIMUM']
+VECTOR_MATH_OPERATIONS = ['ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'MULTIPLY_ADD', 'SCALE', 'LENGTH', 'NORMALIZE']
+ZERO = (0.0, 0.0, 0.0)
+GREY = (0.8, 0.8, 0.8, 1.0)
+
+PRINCIPLED_INPUTS = [('Base Color', 'RGBA', GREY), ('Subsurface', 'VALUE', 0.0), ('Subsurface Radius', 'VECTOR', (1.0, 0.2, 0.1)),
+    ('Subsurface Color', 'RGBA', GREY), ('Subsurface IOR', 'VALUE', 1.4), ('Subsurface Anisotropy', 'VALUE', 0.0),
+    ('Metallic', 'VALUE', 0.0), ('Specular', 'VALUE', 0.5), ('Specular Tint', 'VALUE', 0.0), ('Roughness', 'VALUE', 0.5),
+    ('Anisotropic', 'VALUE', 0.0), ('Anisotropic Rotation', 'VALUE', 0.0), ('Sheen', 'VALUE', 0.0), ('Sheen Tint', 'VALUE', 0.5),
+    ('Clearcoat', 'VALUE', 0.0), ('Clearcoat Roughness', 'VALUE', 0.03), ('IOR', 'VALUE', 1.45), ('Transmission', 'VALUE', 0.0),
+    ('Transmission Roughness', 'VALUE', 0.0), ('Emission', 'RGBA', (0.0, 0.0, 0.0, 1.0)), ('Emission Strength', 'VALUE', 1.0),
+    ('Alpha', 'VALUE', 1.0), ('Normal', 'VECTOR', ZERO), ('Clearcoat Normal', 'VECTOR', ZERO), ('Tangent', 'VECTOR', ZERO),
+    ('Weight', 'VALUE', 0.0)]
+
+NODE_CLASSES = {cls.__name__: cls for cls in [
+    _shader_node('ShaderNodeMath', [('Value', 'VALUE', 0.5)] * 3, [('Value', 'VALUE', 0.0)],
+        [Property('operation', 'ENUM', 'ADD', MATH_OPERATIONS), Property('use_clamp', 'BOOLEAN', False)]),
+    _shader_node('ShaderNodeVectorMath', [('Vector', 'VECTOR', ZERO)] * 3 + [('Scale', 'VALUE', 1.0)],
+        [('Vector', 'VECTOR', ZERO), ('Value', 'VALUE', 0.0)], [Property('operation', 'ENUM', 'ADD', VECTOR_MATH_OPERATIONS)]),
+    _shader_node('ShaderNodeValue', [], [('Value', 'VALUE', 0.5)]),
+    _shader_node('ShaderNodeTexCoord', [], [('Generated', 'VECTOR', ZERO), ('Normal', 'VECTOR', ZERO), ('UV', 'VECTOR', ZERO)]),
+    _shader_node('ShaderNodeBsdfPrincipled', PRINCIPLED_INPUTS, [('BSDF', 'SHADER', None)],
+        [Property('distribution', 'ENUM', 'GGX', ['GGX', 'MULTI_GGX']),
+        Property('subsurface_method', 'ENUM', 'RANDOM_WALK', ['BURLEY', 'RANDOM_WALK'])]),
+    _shader_node('ShaderNodeOutputMaterial', [('Surface', 'SHADER', None), ('Volume', 'SHADER', None), ('Displacement', 'VECTOR', ZERO)], [],
+        [Property('target', 'ENUM', 'ALL', ['ALL', 'EEVEE', 'CYCLES']), Property('is_active_output', 'BOOLEAN', True)]),
+    NodeGroupInput, NodeGroupOutput, ShaderNodeGroup,
+]}
+
+class Link(bpy_struct):
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+        self.from_node = from_socket.node
+        self.to_node = to_socket.node
+
+class Nodes(bpy_prop_collection):
+    def __init__(self, tree):
+        super().__init__()
+        self.tree = tree
+
+    def new(self, type):
+        node = NODE_CLASSES[type](self.tree)
+        names = set(n.name for n in self)
+        base, index = node.name, 1
+        while node.name in names:
+            node.name = "%s.%03d" % (base, index)
+            index += 1
+        self.append(node)
+        return node
+
+    def remove(self, node):
+        for link in list(self.tree.links):
+            if link.from_node is node or link.to_node is node:
+                self.tree.links.remove(link)
+        list.remove(self, node)
+
+    def clear(self):
+        for node in list(self):
+            self.remove(node)
+
+    def foreach_get(self, attribute, values):
+        size = len(values) // len(self) if len(self) else 0
+        for i, node in enumerate(self):
+            values[i * size:(i + 1) * size] = list(getattr(node, attribute))
+
+    def foreach_set(self, attribute, values):
+        values = list(values)
+        size = len(values) // len(self) if len(self) else 0
+        for i, node in enumerate(self):
+            setattr(node, attribute, Vector(values[i * size:(i + 1) * size]))
+
+class Links(bpy_prop_collection):
+    def new(self, input, output):
+        for link in list(input.links):
+            self.remove(link)
+        link = Link(output, input)
+        self.append(link)
+        output.links.append(link)
+        input.links.append(link)
+        return link
+
+    def remove(self, link):
+        list.remove(self, link)
+        link.from_socket.links.remove(link)
+        link.to_socket.links.remove(link)
+
+class ID(bpy_struct):
+    def __init__(self, name):
+        self.name = name
+        self.__properties = {}
+
+    def __getitem__(self, key):
+        return self.__properties[key]
+
+    def __setitem__(self, key, value):
+        self.__properties[key] = value
+
+    def __delitem__(self, key):
+        del self.__properties[key]
+
+    def __contains__(self, key):
+        return key in self.__properties
+
+    def get(self, key, default = None):
+        return self.__properties.get(key, default)
+
+    def user_remap(self, new_id):
+        # nothing uses datablocks in the stand-in
+        pass
+
+class ShaderNodeTree(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.nodes = Nodes(self)
+        self.links = Links()
+        self.inputs = Interface()
+        self.outputs = Interface()
+
+    def copy(self):
+        # the copy gets an empty node tree
+        return data.node_groups.new(self.name)
+
+class Material(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.node_tree = ShaderNodeTree(name)
+        self.use_nodes = False
+
+    def copy(self):
+        # the copy gets an empty node tree
+        return data.materials.new(self.name)
+
+class DataCollection(bpy_prop_collection):
+    def __init__(self, id_class):
+        super().__init__()
+        self.id_class = id_class
+
+    def new(self, name, *args):
+        names = set(x.name for x in self)
+        base, index = name, 1
+        while name in names:
+            name = "%s.%03d" % (base, index)
+            index += 1
+        datablock = self.id_class(name)
+        self.append(datablock)
+        return datablock
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for datablock in self:
+                if datablock.name == key:
+                    return datablock
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return any(datablock.name == key for datablock in self)
+        return list.__contains__(self, key)
+
+    def get(self, key, default = None):
+        return self[key] if key in self else default
+
+types = _types.SimpleNamespace(bpy_struct = bpy_struct, bpy_prop_collection = bpy_prop_collection, Node = Node,
+    ShaderNode = ShaderNode, ID = ID, ShaderNodeTree = ShaderNodeTree, Material = Material, **NODE_CLASSES)
+data = _types.SimpleNamespace(materials = DataCollection(Material), node_groups = DataCollection(ShaderNodeTree))
+app = _types.SimpleNamespace(version = (3, 6, 0), timers = None)
+context = _types.SimpleNamespace(preferences = _types.SimpleNamespace(addons = {}))
+_config = tempfile.mkdtemp()
+utils = _types.SimpleNamespace(user_resource = lambda kind: os.path.join(_config, kind.lower()))
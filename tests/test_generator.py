@@ -0,0 +1,222 @@
+import asyncio
+import bpy
+import pytest
+
+from nodes_for_python import NodeSystem, NodeGenerator
+
+class Timers:
+    """
+    Stand-in for bpy.app.timers where the test decides when the registered functions run.
+    """
+    def __init__(self):
+        self.functions = {}
+
+    def register(self, function, first_interval = 0.0):
+        self.functions[function] = first_interval
+
+    def unregister(self, function):
+        del self.functions[function]
+
+    def is_registered(self, function):
+        return function in self.functions
+
+    def tick(self):
+        """
+        Runs every registered function once, returns True while some are still registered.
+        """
+        for function in list(self.functions):
+            if function() is None:
+                self.functions.pop(function, None)
+        return bool(self.functions)
+
+def build(scale, count = 50):
+    ns = NodeSystem()
+    coordinates = ns.TexCoord()
+    vector = coordinates.o0
+    for _ in range(count):
+        vector = vector * scale + coordinates.o2
+    output = ns.OutputMaterial()
+    output.displacement = vector
+    return output
+
+def test_generate_async_runs_in_slices():
+    generator = NodeGenerator()
+    expected = generator.generate(build(1.5), "sync")
+    timers = Timers()
+    progress = []
+    task = generator.generate_async(build(1.5), "async", time_slice = 0.0, timers = timers,
+        progress = lambda done, total: progress.append((done, total)))
+
+    ticks = 0
+    while timers.tick():
+        ticks += 1
+    material = task.result()
+
+    total = len(expected.node_tree.nodes) + len(expected.node_tree.links)
+    assert ticks == total
+    assert [done for done, _ in progress] == sorted(done for done, _ in progress)
+    assert progress[-1] == (total, total)
+    assert task.done() and task.progress == 1.0
+    assert material.name == "async"
+    assert len(material.node_tree.nodes) == len(expected.node_tree.nodes)
+    assert len(material.node_tree.links) == len(expected.node_tree.links)
+
+def test_cancel_leaves_the_material_untouched():
+    generator = NodeGenerator()
+    material = generator.generate(build(1.5, 10), "cancelled")
+    nodes = list(material.node_tree.nodes)
+    timers = Timers()
+    task = generator.generate_async(build(2.0), "cancelled", time_slice = 0.0, timers = timers)
+
+    for _ in range(20):
+        timers.tick()
+    assert 0 < task.units_done < task.units_total
+    assert list(material.node_tree.nodes) == nodes
+
+    assert task.cancel()
+    assert task.cancelled() and not timers.functions
+    assert [m.name for m in bpy.data.materials if m.name.startswith("cancelled")] == ["cancelled"]
+    assert bpy.data.materials["cancelled"] is material
+    assert list(material.node_tree.nodes) == nodes
+    with pytest.raises(asyncio.CancelledError):
+        task.result()
+
+def test_await_generation():
+    generator = NodeGenerator()
+    timers = Timers()
+
+    async def main():
+        task = generator.generate_async(build(1.5), "awaited", timers = timers)
+        # the awaiting coroutine waits on a future instead of being resumed on every loop iteration
+        assert isinstance(next(task.__await__()), asyncio.Future)
+        waiter = asyncio.ensure_future(task)
+        while timers.tick():
+            await asyncio.sleep(0)
+        return await waiter
+
+    assert asyncio.run(main()).name == "awaited"
+
+def test_reuse_tells_value_literals_apart():
+    def build_shade(value):
+        ns = NodeSystem()
+        output = ns.OutputMaterial()
+        output.displacement = ns.value(value) * ns.TexCoord().o0
+        return output
+
+    generator = NodeGenerator()
+    dark = generator.generate(build_shade(0.2), "Dark", reuse = True)
+    light = generator.generate(build_shade(0.8), "Light", reuse = True)
+    assert light is not dark and light.name == "Light"
+    assert generator.generate(build_shade(0.2), "Dark again", reuse = True) is dark
+
+def build_chain(scale, insert = None):
+    ns = NodeSystem()
+    coordinates = ns.TexCoord()
+    vector = coordinates.o0
+    if insert == "source":
+        vector = ns.vector_normalize(vector)
+    for _ in range(50):
+        vector = vector * scale + coordinates.o2
+    if insert == "output":
+        vector = ns.vector_normalize(vector)
+    output = ns.OutputMaterial()
+    output.displacement = vector
+    return output
+
+@pytest.mark.parametrize("insert", ["output", "source"])
+def test_incremental_insertion_only_touches_the_new_node(insert):
+    generator = NodeGenerator()
+    material = generator.generate(build_chain(1.5), "inserted " + insert, incremental = True)
+    before = {n.name: n.bl_idname for n in material.node_tree.nodes}
+
+    generator.generate(build_chain(1.5, insert), material, incremental = True)
+    statistics = generator.statistics
+    assert (statistics["created_nodes"], statistics["removed_nodes"]) == (1, 0)
+    assert (statistics["created_links"], statistics["removed_links"]) == (2, 1)
+    assert statistics["written_values"] == 1
+    after = {n.name: n.bl_idname for n in material.node_tree.nodes}
+    assert all(after[name] == class_name for name, class_name in before.items())
+
+def test_variants_only_set_group_inputs():
+    ns = NodeSystem()
+    coordinates = ns.TexCoord()
+    output = ns.OutputMaterial()
+    output.displacement = coordinates.o0 * ns.parameter("scale", default_value = 1.0) + coordinates.o2
+
+    generator = NodeGenerator()
+    materials = generator.generate_variants(output, "Variants", [{"scale": 2.0}, {}], "Variant.{index:03d}")
+    group = bpy.data.node_groups["Variants"]
+    assert [s.name for s in group.inputs] == ["scale"]
+    assert [m.name for m in materials] == ["Variant.000", "Variant.001"]
+    for material, scale in zip(materials, (2.0, 1.0)):
+        nodes = {n.bl_idname: n for n in material.node_tree.nodes}
+        assert sorted(nodes) == ["ShaderNodeGroup", "ShaderNodeOutputMaterial"]
+        assert nodes["ShaderNodeGroup"].node_tree is group
+        assert nodes["ShaderNodeGroup"].inputs[0].default_value == scale
+        [link] = material.node_tree.links
+        assert link.from_socket is nodes["ShaderNodeGroup"].outputs[0]
+        assert link.to_socket.name == "Displacement"
+
+def test_outline_replaces_repeated_cones_with_a_group_node():
+    outputs = [build(1.5, 3), build(1.5, 3)]
+    generator = NodeGenerator()
+    [group] = generator.outline(outputs, name = "Outlined")
+    assert generator.statistics == {"groups": 1, "replaced_nodes": 12}
+    assert sorted(n.bl_idname for n in group.nodes) == ["NodeGroupInput", "NodeGroupOutput"] + ["ShaderNodeVectorMath"] * 6
+    assert len(group.inputs) == 2 and len(group.outputs) == 1
+
+    for i, output in enumerate(outputs):
+        material = generator.generate(output, f"outlined {i}")
+        nodes = {n.bl_idname: n for n in material.node_tree.nodes}
+        assert sorted(nodes) == ["ShaderNodeGroup", "ShaderNodeOutputMaterial", "ShaderNodeTexCoord"]
+        group_node = nodes["ShaderNodeGroup"]
+        assert group_node.node_tree is group
+        assert all(len(input.links) == 1 for input in group_node.inputs)
+        assert [link.to_socket.name for link in group_node.outputs[0].links] == ["Displacement"]
+
+def build_group(scale, count = 10):
+    ns = NodeSystem()
+    group_input = ns.GroupInput()
+    group_input.add_output("Value", 'VALUE')
+    value = group_input.get_output(0)
+    for _ in range(count):
+        value = value * scale + 1.0
+    group_output = ns.GroupOutput()
+    group_output.add_input("Value", 'VALUE')
+    group_output.get_input(0).set_value(value)
+    return group_output
+
+class FailingLayout:
+    def layout_graph(self, graph, previous = None, keys = None):
+        raise RuntimeError("layout failed")
+
+def test_failed_detached_build_leaves_the_target_untouched():
+    generator = NodeGenerator()
+    material = generator.generate(build(1.5, 10), "detached")
+    nodes = list(material.node_tree.nodes)
+    with pytest.raises(RuntimeError):
+        generator.generate(build(2.0), "detached", layout = FailingLayout(), detached = True)
+    assert [m.name for m in bpy.data.materials if m.name.startswith("detached")] == ["detached"]
+    assert bpy.data.materials["detached"] is material
+    assert list(material.node_tree.nodes) == nodes
+
+    group = generator.generate_group(build_group(1.5), "detached group")
+    nodes = list(group.nodes)
+    with pytest.raises(RuntimeError):
+        generator.generate_group(build_group(2.0, 20), "detached group", layout = FailingLayout(), detached = True)
+    assert [g.name for g in bpy.data.node_groups if g.name.startswith("detached group")] == ["detached group"]
+    assert bpy.data.node_groups["detached group"] is group
+    assert list(group.nodes) == nodes and [s.name for s in group.inputs] == ["Value"]
+
+    built = generator.generate_group(build_group(2.0, 20), "detached group", detached = True)
+    assert built is not group and built.name == "detached group"
+    assert bpy.data.node_groups["detached group"] is built and group not in bpy.data.node_groups
+    assert len(built.nodes) == 42
+
+def test_reuse_returns_the_group_of_an_identical_graph():
+    generator = NodeGenerator()
+    group = generator.generate_group(build_group(1.5), "reused group", reuse = True)
+    assert generator.generate_group(build_group(1.5), "reused group again", reuse = True) is group
+    assert generator.statistics["reused"] == "reused group"
+    other = generator.generate_group(build_group(2.0), "other group", reuse = True)
+    assert other is not group and other.name == "other group"
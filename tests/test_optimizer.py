@@ -0,0 +1,95 @@
+from nodes_for_python import NodeSystem
+from nodes_for_python.graph import NodeGraph
+import nodes_for_python.optimizer as optimizer
+
+def graph_nodes(root):
+    return sorted((n.class_name, getattr(n, "operation", None)) for n in NodeGraph.from_roots([root]).nodes)
+
+def test_fuse_after_simplify():
+    ns = NodeSystem()
+    a, b, c = ns.Value(), ns.Value(), ns.Value()
+    output = ns.OutputMaterial()
+    output.displacement = ns.math_add(ns.math_multiply(ns.math_multiply(a, b), 1.0), c)
+
+    assert optimizer.Simplifier().simplify(output) == 1
+    assert optimizer.fuse(output) == (1, {"multiply_add": 1})
+    assert ('ShaderNodeMath', 'MULTIPLY_ADD') in graph_nodes(output)
+
+def test_simplify_leaves_held_nodes_intact():
+    ns = NodeSystem()
+    a = ns.Value()
+    shared = ns.math_multiply(a, 1.0)
+    first = ns.OutputMaterial()
+    first.displacement = ns.math_add(shared, 0.5)
+
+    assert optimizer.Simplifier().simplify(first) == 1
+    assert shared.node.get_input(0).link.output.node is a
+    second = ns.OutputMaterial()
+    second.displacement = shared + 0.1
+    assert ('ShaderNodeValue', None) in graph_nodes(second)
+
+def test_fan_out_counts_consumers_reachable_from_the_roots():
+    ns = NodeSystem()
+    a, b, c = ns.Value(), ns.Value(), ns.Value()
+    product = ns.math_multiply(a, b)
+    unrelated = product + 1.0
+    output = ns.OutputMaterial()
+    output.displacement = ns.math_add(product, c)
+
+    assert optimizer.fuse(output) == (1, {"multiply_add": 1})
+    assert ('ShaderNodeMath', 'MULTIPLY_ADD') in graph_nodes(output)
+    assert unrelated.node.get_input(0).link.output is product
+
+def test_cse_drops_nodes_relinked_by_a_pass():
+    ns = NodeSystem(cse = True)
+    c = ns.Value()
+    constant = ns.math_add(1.0, 2.0)
+    total = ns.math_add(constant, c)
+    output = ns.OutputMaterial()
+    output.displacement = total
+
+    assert optimizer.fold_constants(output) == 1
+    assert not total.node.get_input(0).link
+    rebuilt = ns.math_add(constant, c)
+    assert rebuilt is not total
+    assert rebuilt.node.get_input(0).link.output is constant
+    assert ns.math_add(constant, c) is rebuilt
+
+def test_rewrites_build_fresh_nodes_under_cse():
+    ns = NodeSystem(cse = True)
+    a, b = ns.Value(), ns.Value()
+    held = ns.math_substract(a, b)
+    output = ns.OutputMaterial()
+    output.displacement = ns.math_add(a, ns.math_multiply(b, -1.0))
+
+    assert optimizer.Simplifier().simplify(output) == 1
+    subtract = output.get_input(2).link.output
+    assert subtract is not held and subtract.node.get_input(0).link.output.node is a
+
+def test_fold_keeps_links_to_group_outputs():
+    ns = NodeSystem()
+    group_output = ns.GroupOutput()
+    group_output.add_input("Result", 'VALUE')
+    group_output.i0 = ns.math_add(ns.math_add(1.0, 2.0), 3.0)
+
+    assert optimizer.fold_constants(group_output) == 1
+    result = group_output.get_input(0).link.output.node
+    assert result.get_input(0).value == 3.0 and not result.get_input(0).link
+
+def chain_operands(output):
+    node = output.node
+    if node.class_name != 'ShaderNodeMath' or getattr(node, "operation", None) != 'ADD':
+        return [output]
+    return chain_operands(node.get_input(0).link.output) + chain_operands(node.get_input(1).link.output)
+
+def test_rebalance_keeps_operand_order():
+    ns = NodeSystem()
+    values = [ns.Value().o0 for _ in range(6)]
+    chain = values[-1]
+    for value in reversed(values[:-1]):
+        chain = ns.math_add(value, chain)
+    output = ns.OutputMaterial()
+    output.displacement = chain
+
+    assert optimizer.rebalance(output) == 1
+    assert chain_operands(output.get_input(2).link.output) == values
@@ -1,14 +1,66 @@
 import bpy
-import inspect
+
+class PropertyInfo:
+    def __init__(self, name, type, default, enum_items = None):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.enum_items = enum_items
+
+    def __str__(self):
+        return 'PropertyInfo(name='+self.name+')'
+
+_property_infos = {}
 
 def get_shader_names():
     return [s.__name__ for s in bpy.types.ShaderNode.__subclasses__()]    
 
-def get_properties(node):
-    return dict(inspect.getmembers(node))
+def get_property_infos(node_class):
+    """
+    Returns the writable RNA properties node_class adds to bpy.types.ShaderNode, as a list of PropertyInfo.
+    Only the RNA definitions are read (no node instance is needed) and the result is cached per class.
+    """
+    infos = _property_infos.get(node_class.__name__)
+    if infos is None:
+        base = set(p.identifier for p in bpy.types.ShaderNode.bl_rna.properties)
+        infos = []
+        for prop in node_class.bl_rna.properties:
+            if prop.identifier in base or prop.is_readonly or prop.type == 'COLLECTION':
+                continue
+            enum_items = [item.identifier for item in prop.enum_items] if prop.type == 'ENUM' else None
+            infos.append(PropertyInfo(prop.identifier, prop.type, rna_default(prop), enum_items))
+        _property_infos[node_class.__name__] = infos
+    return infos
 
-def get_own_properties(parent_props, node):
-    return {name: value for name, value in inspect.getmembers(node) if name not in parent_props}
+def rna_default(prop):
+    if prop.type == 'POINTER':
+        return None
+    if prop.type == 'ENUM' and prop.is_enum_flag:
+        return tuple(sorted(prop.default_flag))
+    if getattr(prop, "is_array", False):
+        return plain_value(prop.default_array)
+    return prop.default
+
+def plain_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bpy.types.bpy_struct):
+        raise TypeError("not a plain value: " + repr(value))
+    try:
+        items = tuple(value)
+    except TypeError:
+        raise TypeError("not a plain value: " + repr(value))
+    return tuple(plain_value(v) for v in items)
+
+def get_socket_specs(sockets):
+    result = []
+    for socket in sockets:
+        try:
+            default_value = plain_value(getattr(socket, "default_value", None))
+        except TypeError:
+            default_value = None
+        result.append((socket.name, socket.type, default_value))
+    return result
 
 def get_input_types(node):
     result = set()
@@ -51,6 +103,6 @@ def is_numeric_type(self):
 def get_all_ancestors(nodes):
     collect = set(nodes)
     while nodes:
-        nodes = set(i.node for n in nodes for i in n.inputs if i.node not in collect)
+        nodes = set(a for n in nodes for a in n.get_input_nodes() if a not in collect)
         collect.update(nodes)
     return collect